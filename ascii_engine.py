@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Engine - In-process ASCII rasterizer built on Pillow and NumPy
+Replaces the per-frame ascii-image-converter subprocess calls
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+# Same character ramps ascii-image-converter uses (darkest -> brightest)
+CHARSET_SIMPLE = ' .:-=+*#%@'
+CHARSET_FULL = (' .\'`^",:;Il!i><~+_-?][}{1)(|\\/'
+                'tfjrxnuvczXYUJCLQ0OZmwqpdbkhao*#MW&8%B@$')
+
+# Output width in characters ('-f' full scale vs SMOL™)
+FULL_SCALE_COLUMNS = 160
+SMOL_COLUMNS = 80
+
+FONT_SIZE = 12
+
+# Most glyph alpha levels kept: a GIF palette holds 256 entries, one of
+# which is the transparent index
+MAX_LEVELS = 255
+
+# Bump when rendering changes so cached results are invalidated
+ENGINE_VERSION = 3
+FONT_CANDIDATES = ('DejaVuSansMono.ttf', 'consola.ttf', 'cour.ttf',
+                   'Menlo.ttc', 'LiberationMono-Regular.ttf')
+
+# ITU-R BT.601 luma weights
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def get_flags(settings):
+    """Return the ascii-image-converter flags equivalent to the settings."""
+    flags = []
+    if not settings['full_scale']:
+        flags.append('-f')
+    if settings['full_char']:
+        flags.append('-c')
+    if settings['color']:
+        flags.append('-C')
+    if settings['columns'] or settings['rows']:
+        flags += ['-d', f'{settings["columns"]},{settings["rows"]}']
+    elif settings['width']:
+        flags += ['-W', str(settings['width'])]
+    return flags
+
+
+def load_font(size=FONT_SIZE):
+    """Load a monospaced font, falling back to Pillow's built-in font."""
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=None)
+def get_atlas(charset, size=FONT_SIZE):
+    """Pre-rasterize every glyph of a charset into an (n, h, w) alpha atlas."""
+    font = load_font(size)
+    if hasattr(font, 'getmetrics'):
+        ascent, descent = font.getmetrics()
+        cell_h = ascent + descent
+        cell_w = max(1, int(round(font.getlength('M'))))
+    else:
+        left, top, right, bottom = font.getbbox('M')
+        cell_h = bottom + 2
+        cell_w = right - left + 1
+
+    atlas = np.zeros((len(charset), cell_h, cell_w), dtype=np.uint8)
+    for i, char in enumerate(charset):
+        glyph = Image.new('L', (cell_w, cell_h), 0)
+        ImageDraw.Draw(glyph).text((0, 0), char, fill=255, font=font)
+        atlas[i] = np.asarray(glyph)
+
+    atlas.setflags(write=False)
+    return atlas
+
+
+@lru_cache(maxsize=None)
+def get_level_atlas(charset, size=FONT_SIZE):
+    """The atlas as indices into its sorted alpha levels: (levels, level atlas).
+
+    Levels always include 0, the background. Fonts with more anti-aliasing
+    levels than MAX_LEVELS are snapped to MAX_LEVELS evenly spaced ones.
+    """
+    atlas = get_atlas(charset, size)
+    levels = np.union1d(np.unique(atlas), [0]).astype(np.uint8)
+    if len(levels) > MAX_LEVELS:
+        levels = np.rint(np.linspace(0, 255, MAX_LEVELS)).astype(np.uint8)
+        level_atlas = np.rint(atlas * ((MAX_LEVELS - 1) / 255)).astype(np.uint8)
+    else:
+        level_atlas = np.searchsorted(levels, atlas).astype(np.uint8)
+    levels.setflags(write=False)
+    level_atlas.setflags(write=False)
+    return levels, level_atlas
+
+
+@lru_cache(maxsize=None)
+def get_lut(charset_length):
+    """Build a 256-entry luminance -> charset index lookup table."""
+    lut = (np.arange(256, dtype=np.uint32) * charset_length) // 256
+    lut = lut.astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+class ASCIIEngine:
+    """Converts frames to rendered ASCII art entirely in-process."""
+
+    def __init__(self, settings, font_size=FONT_SIZE):
+        self.settings = settings
+        self.charset = CHARSET_FULL if settings['full_char'] else CHARSET_SIMPLE
+        self.color = settings['color']
+        self.columns = SMOL_COLUMNS if settings['full_scale'] else FULL_SCALE_COLUMNS
+        self.atlas = get_atlas(self.charset, font_size)
+        self.levels, self.level_atlas = get_level_atlas(self.charset, font_size)
+        self.lut = get_lut(len(self.charset))
+        self.cell_h, self.cell_w = self.atlas.shape[1:]
+
+        # Explicit sizes override the preset: columns, else an output width in pixels
+        self.fixed_columns = bool(settings['columns'] or settings['width'])
+        if settings['columns']:
+            self.columns = settings['columns']
+        elif settings['width']:
+            self.columns = max(1, settings['width'] // self.cell_w)
+        self.rows = settings['rows']
+
+    @property
+    def flags(self):
+        return get_flags(self.settings)
+
+    def grid_size(self, width, height):
+        """Return (columns, rows) of the character grid for a source size."""
+        if self.rows and self.fixed_columns:
+            return self.columns, self.rows
+        # Cells are taller than wide, so fewer rows keep the aspect ratio
+        aspect = height / width * self.cell_w / self.cell_h
+        if self.rows:
+            return max(1, int(round(self.rows / aspect))), self.rows
+        columns = self.columns if self.fixed_columns else max(1, min(self.columns, width))
+        return columns, max(1, int(round(columns * aspect)))
+
+    def fix_grid(self, width, height):
+        """Pin the grid to the one of a source size, whatever size frames arrive in.
+
+        Used when the decoder already scales frames down to the grid.
+        """
+        self.columns, self.rows = self.grid_size(width, height)
+        self.fixed_columns = True
+        return self.columns, self.rows
+
+    def to_cells(self, frame):
+        """Block-average a frame into (rows, columns, 3) RGB cells."""
+        if isinstance(frame, np.ndarray):
+            image = Image.fromarray(frame)
+        else:
+            image = frame
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        size = self.grid_size(*image.size)
+        # BOX resampling averages each source block into one cell
+        return np.asarray(image.resize(size, Image.BOX), dtype=np.uint8)
+
+    def narrow_band(self, image, columns, top, bottom):
+        """Source rows ``top:bottom`` averaged down to ``columns`` wide.
+
+        This is the horizontal pass of the BOX resize in to_cells, which
+        Pillow runs row by row before the vertical pass. Stacking every
+        band and passing it to cells_from_bands gives exactly the cells of
+        to_cells, while only one band is ever converted to RGB.
+        """
+        band = image.crop((0, top, image.width, bottom))
+        if band.mode != 'RGB':
+            band = band.convert('RGB')
+        return np.asarray(band.resize((columns, bottom - top), Image.BOX), dtype=np.uint8)
+
+    def cells_from_bands(self, bands, rows):
+        """The vertical pass: stacked narrow bands averaged down to ``rows``."""
+        narrow = Image.fromarray(np.concatenate(bands))
+        return np.asarray(narrow.resize((narrow.width, rows), Image.BOX), dtype=np.uint8)
+
+    def cells_to_grid(self, cells):
+        """Map cells to (char indices, cell colors or None) for this charset."""
+        luminance = (cells @ LUMA_WEIGHTS).astype(np.uint8)
+        indices = self.lut[luminance]
+        return indices, (cells if self.color else None)
+
+    def to_grid(self, frame):
+        """Block-average a frame into (char indices, cell colors or None)."""
+        return self.cells_to_grid(self.to_cells(frame))
+
+    def render(self, indices, colors=None):
+        """Render a character grid to an RGB frame via atlas gather/tile."""
+        rows, columns = indices.shape
+        # (rows, cols, h, w) -> (rows, h, cols, w) -> (rows*h, cols*w)
+        glyphs = self.atlas[indices].transpose(0, 2, 1, 3)
+
+        if colors is None:
+            plane = glyphs.reshape(rows * self.cell_h, columns * self.cell_w)
+            return np.repeat(plane[:, :, None], 3, axis=2)
+
+        alpha = glyphs[:, :, :, :, None].astype(np.uint16)
+        tint = colors[:, None, :, None, :].astype(np.uint16)
+        pixels = (alpha * tint + 127) // 255
+        return pixels.astype(np.uint8).reshape(
+            rows * self.cell_h, columns * self.cell_w, 3)
+
+    def render_indexed(self, indices, colors, palette):
+        """Render a character grid straight to a palette-indexed frame.
+
+        Each cell color is quantized once, then every pixel is a lookup of
+        (cell color, glyph alpha level) in the palette's shade table, so no
+        truecolor frame is ever built.
+        """
+        rows, columns = indices.shape
+        glyphs = self.level_atlas[indices].transpose(0, 2, 1, 3)
+        shades = palette.shades(self.levels)
+        if colors is None:
+            pixels = shades[0][glyphs]
+        else:
+            cells = palette.index(colors)
+            pixels = shades[cells[:, None, :, None], glyphs]
+        return pixels.reshape(rows * self.cell_h, columns * self.cell_w)
+
+    def convert(self, frame):
+        """Convert a frame (ndarray or PIL image) to a rendered ASCII frame."""
+        return self.render(*self.to_grid(frame))
+
+    def convert_file(self, source, destination):
+        """Convert an image file on disk and save the rendered result."""
+        with Image.open(source) as image:
+            result = self.convert(image)
+        Image.fromarray(result).save(destination)
+        return destination
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Batch - Convert whole directories of media across all cores
+Jobs fan out over a process pool and progress is kept in a resumable manifest
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import core
+from core import ERROR, WARN, OK, INFO
+from cli import (add_settings_arguments, add_telemetry_arguments, output_path_for,
+                 settings_from_args, work_dir_for)
+from metrics import create_telemetry
+from scheduler import available_memory_mb
+
+
+MANIFEST_NAME = 'manifest.json'
+
+# Images below this size are packed together so per-task overhead stays small
+SMALL_IMAGE_BYTES = 2 * 1024 * 1024
+IMAGES_PER_UNIT = 16
+# Interpreter, NumPy, Pillow and atlases of one worker process
+WORKER_BASE_MB = 150
+
+
+def find_inputs(source):
+    """Expand a directory (recursively) or glob pattern into supported files."""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, '**', '*'), recursive=True)
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(os.path.abspath(path) for path in paths
+                  if os.path.isfile(path) and (core.is_image(path) or core.is_video(path)))
+
+
+def plan_outputs(inputs, output_dir, output_format=None):
+    """Give every input its own output path, mirroring the source tree.
+
+    Inputs sharing a stem in one directory (x.jpg, x.png) are told apart as
+    in output_path_for. Inputs are sorted, so the names are stable.
+    """
+    if not inputs:
+        return {}
+    root = os.path.commonpath([os.path.dirname(path) for path in inputs])
+    outputs = {}
+    taken = set()
+    for path in inputs:
+        directory = os.path.join(output_dir, os.path.relpath(os.path.dirname(path), root))
+        outputs[path] = os.path.normpath(output_path_for(path, directory, output_format, taken))
+    return outputs
+
+
+def pack_units(inputs):
+    """Group inputs into work units: one per video, small images packed together."""
+    units = []
+    small = []
+    for path in inputs:
+        if core.is_image(path) and os.path.getsize(path) < SMALL_IMAGE_BYTES:
+            small.append(path)
+            if len(small) == IMAGES_PER_UNIT:
+                units.append(small)
+                small = []
+        else:
+            units.append([path])
+    if small:
+        units.append(small)
+    return units
+
+
+class Manifest:
+    """JSON record of finished jobs so an interrupted batch can resume.
+
+    Jobs are keyed on their output path, which is unique per job, and
+    remember the input they were converted from.
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.jobs = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f'{WARN} Ignoring unreadable manifest {path}: {e}')
+                return
+            if data.get('settings') == settings:
+                self.jobs = data.get('jobs', {})
+            else:
+                print(f'{WARN} Settings changed since last run, starting fresh.')
+
+    def is_done(self, output_path, file_path):
+        job = self.jobs.get(output_path)
+        return (job is not None and job['status'] == 'done'
+                and job.get('source') == file_path
+                and all(os.path.exists(output) for output in job['outputs']))
+
+    def record(self, output_path, file_path, outputs=None, error=None):
+        if error is None:
+            self.jobs[output_path] = {'status': 'done', 'source': file_path,
+                                      'outputs': outputs}
+        else:
+            self.jobs[output_path] = {'status': 'failed', 'source': file_path,
+                                      'error': error}
+
+    def save(self):
+        """Write atomically so a crash never leaves a truncated manifest."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'settings': self.settings, 'jobs': self.jobs}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def _init_worker(threads):
+    """Limit per-process threads so processes x threads matches the cores."""
+    core.MAX_THREADS = threads
+
+
+def plan_workers(settings, workers=None):
+    """Pick (processes, threads per process) from the cores and memory.
+
+    Files are independent, so they go to a process pool. Each process
+    converts its frames on threads (see scheduler.py). Process count is
+    capped so every process fits its memory budget in available memory.
+    """
+    cores = settings['jobs'] or core.MAX_THREADS
+    if not workers:
+        workers = cores
+        available = available_memory_mb()
+        if available:
+            per_worker = settings['max_memory_mb'] + WORKER_BASE_MB
+            workers = min(workers, max(1, available // per_worker))
+    return workers, max(1, cores // workers)
+
+
+def run_unit(unit, outputs, settings, telemetry_options=()):
+    """Convert every file of a work unit. Runs inside a worker process."""
+    telemetry = create_telemetry(*telemetry_options)
+    results = []
+    for file_path in unit:
+        output_path = outputs[file_path]
+        work_dir = work_dir_for(output_path)
+        try:
+            written = core.convert_file(file_path, output_path, settings, work_dir=work_dir,
+                                        telemetry=telemetry)
+            results.append((file_path, written, None))
+        except Exception as e:
+            results.append((file_path, None, str(e)))
+    return results
+
+
+def run_batch(source, output_dir, settings, workers=None, telemetry_options=(),
+              output_format=None):
+    """Convert every supported file under ``source``. Returns (done, failed).
+
+    ``telemetry_options`` are the create_telemetry() arguments, rebuilt in
+    each worker process so all jobs can share one metrics file.
+    """
+    settings = dict(core.resolve_settings(settings), open_result=False)
+    workers, threads = plan_workers(settings, workers)
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME), settings)
+    # Never pick up our own results when the output dir is inside the source
+    output_root = os.path.abspath(output_dir) + os.sep
+    inputs = [path for path in find_inputs(source) if not path.startswith(output_root)]
+    outputs = plan_outputs(inputs, output_dir, output_format)
+    todo = [path for path in inputs if not manifest.is_done(outputs[path], path)]
+
+    print(f'{INFO} {len(inputs)} files found, {len(inputs) - len(todo)} already done.')
+    if not todo:
+        return 0, 0
+
+    units = pack_units(todo)
+    workers = min(workers, len(units))
+    print(f'{INFO} Running {len(units)} work units on {workers} processes '
+          f'x {threads} threads.')
+
+    done = failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(threads,)) as executor:
+        # Workers get their thread share; the manifest keeps the user's settings
+        unit_settings = dict(settings, jobs=threads)
+        futures = [executor.submit(run_unit, unit, {path: outputs[path] for path in unit},
+                                   unit_settings, telemetry_options)
+                   for unit in units]
+        for future in as_completed(futures):
+            for file_path, written, error in future.result():
+                manifest.record(outputs[file_path], file_path, written, error)
+                if error is None:
+                    done += 1
+                else:
+                    failed += 1
+                    print(f'{ERROR} {file_path}: {error}')
+            manifest.save()
+            print(f'{OK} {done + failed}/{len(todo)} files processed.')
+
+    create_telemetry(*telemetry_options).event(
+        'batch', files=len(todo), units=len(units), workers=workers,
+        threads_per_worker=threads, done=done, failed=failed,
+        seconds=round(time.perf_counter() - start, 4))
+    return done, failed
+
+
+def main(argv=None):
+    """Batch entry point. Returns the process exit code."""
+    parser = argparse.ArgumentParser(
+        prog='ascii-gen-batch',
+        description='Convert a directory or glob of media to ASCII art in parallel.')
+    parser.add_argument('source', help='Directory or glob pattern (quote it)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Worker processes (default: usable cores, limited by memory)')
+    add_settings_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args(argv)
+
+    core.setup_console()
+    done, failed = run_batch(args.source, args.output_dir,
+                             settings_from_args(args), args.workers,
+                             (args.metrics, args.profile, args.profile_dir), args.format)
+    print(f'{INFO} Batch finished: {done} converted, {failed} failed.')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Benchmark - Reproducible per-stage timing of the image and video pipelines
+Reports wall time, frames per second, peak RSS and output bytes as JSON
+"""
+
+import argparse
+import contextlib
+import glob
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+import imageio
+
+import core
+from ascii_engine import ASCIIEngine
+from encoders import GifWriter, Mp4Writer, glyph_palette
+from probe import probe
+from video_reader import FrameReader
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples')
+
+# (name, width, height, frames); frames == 1 means a still image
+SYNTHETIC_FIXTURES = [
+    ('image_320x240', 320, 240, 1),
+    ('image_1280x720', 1280, 720, 1),
+    ('image_1920x1080', 1920, 1080, 1),
+    ('clip_320x240_30', 320, 240, 30),
+    ('clip_640x360_60', 640, 360, 60),
+    ('clip_1280x720_120', 1280, 720, 120),
+]
+QUICK_FIXTURES = ('image_320x240', 'clip_320x240_30')
+
+# Settings that change the work done by the engine
+ENGINE_SETTINGS = ('full_char', 'color', 'full_scale')
+
+
+def synthetic_frame(width, height, index):
+    """Deterministic moving gradient with noise, so every run sees the same pixels."""
+    rng = np.random.default_rng(index)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = np.stack([
+        (x * 255 // max(1, width - 1) + index * 4) % 256,
+        (y * 255 // max(1, height - 1)),
+        ((x + y) // 4 + index * 8) % 256,
+    ], axis=-1).astype(np.uint8)
+    noise = rng.integers(0, 24, size=frame.shape, dtype=np.uint8)
+    return np.clip(frame.astype(np.int16) + noise - 12, 0, 255).astype(np.uint8)
+
+
+def build_fixtures(directory, quick=False):
+    """Write synthetic fixtures and collect the bundled examples. Returns {name: path}."""
+    fixtures = {}
+    for name, width, height, frames in SYNTHETIC_FIXTURES:
+        if quick and name not in QUICK_FIXTURES:
+            continue
+        if frames == 1:
+            path = os.path.join(directory, name + '.png')
+            Image.fromarray(synthetic_frame(width, height, 0)).save(path)
+        else:
+            path = os.path.join(directory, name + '.mp4')
+            writer = imageio.get_writer(path, fps=24, codec='libx264', quality=8,
+                                        macro_block_size=1)
+            for index in range(frames):
+                writer.append_data(synthetic_frame(width, height, index))
+            writer.close()
+        fixtures[name] = path
+
+    if not quick:
+        for path in sorted(glob.glob(os.path.join(EXAMPLES_DIR, '*.gif'))
+                           + glob.glob(os.path.join(EXAMPLES_DIR, '*.png'))):
+            name = 'example_' + os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+            fixtures[name] = path
+    return fixtures
+
+
+def settings_combinations(quick=False):
+    """Every combination of the engine settings from DEFAULT_SETTINGS."""
+    if quick:
+        return [{key: core.DEFAULT_SETTINGS[key] for key in ENGINE_SETTINGS}]
+    return [dict(zip(ENGINE_SETTINGS, values))
+            for values in itertools.product([False, True], repeat=len(ENGINE_SETTINGS))]
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux only). Returns True on success."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size in MB (since the last reset on Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure(stage, function, frames=None, output=None):
+    """Run one stage and return its metrics."""
+    reset_peak_rss()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    metrics = {
+        'stage': stage,
+        'seconds': round(elapsed, 4),
+        'fps': round(frames / elapsed, 2) if frames and elapsed > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': os.path.getsize(output) if output and os.path.exists(output) else None,
+    }
+    return metrics, result
+
+
+def bench_case(name, path, settings, output_dir):
+    """Benchmark every stage for one fixture and settings combination.
+
+    Outputs go to ``output_dir``, which must not hold the fixtures: they are
+    named after the fixture and would replace it for the next case.
+    """
+    settings = core.resolve_settings(dict(settings, open_result=False, cache=False))
+    engine = ASCIIEngine(settings)
+    stages = []
+    stem = os.path.join(output_dir, name)
+
+    if core.is_image(path):
+        metrics, image = measure('extract', lambda: np.asarray(Image.open(path).convert('RGB')), 1)
+        stages.append(metrics)
+        metrics, result = measure('convert', lambda: engine.convert(image), 1)
+        stages.append(metrics)
+        output = stem + '.png'
+        metrics, _ = measure('encode_png', lambda: Image.fromarray(result).save(output), 1, output)
+        stages.append(metrics)
+    else:
+        info = probe(path)
+
+        def extract():
+            with FrameReader(path, length=info.frame_count) as reader:
+                return list(reader)
+
+        metrics, frames = measure('extract', extract)
+        metrics['fps'] = round(len(frames) / metrics['seconds'], 2) if metrics['seconds'] else None
+        stages.append(metrics)
+
+        metrics, results = measure('convert', lambda: [engine.convert(f) for f in frames], len(frames))
+        stages.append(metrics)
+
+        # GIF outputs are rendered straight to palette indices
+        palette = glyph_palette(engine.color, engine.levels)
+        metrics, indexed = measure(
+            'convert_indexed',
+            lambda: [engine.render_indexed(*engine.to_grid(f), palette) for f in frames],
+            len(frames))
+        stages.append(metrics)
+
+        output = stem + '.gif'
+
+        def encode_gif():
+            writer = GifWriter(output, palette, (engine.cell_h, engine.cell_w))
+            for index, result in enumerate(indexed):
+                writer.write(result, info.frame_duration(index))
+            writer.close()
+
+        metrics, _ = measure('encode_gif', encode_gif, len(results), output)
+        stages.append(metrics)
+
+        output = stem + '.mp4'
+
+        def encode_mp4():
+            writer = Mp4Writer(output, info.fps)
+            for result in results:
+                writer.write(result, None)
+            writer.close()
+
+        metrics, _ = measure('encode_mp4', encode_mp4, len(results), output)
+        stages.append(metrics)
+
+    # Whole pipeline as the GUI/CLI runs it; its status lines go to stderr
+    # so stdout stays valid JSON
+    output = stem + ('.png' if core.is_image(path) else '.gif')
+    with contextlib.redirect_stdout(sys.stderr):
+        metrics, _ = measure('pipeline',
+                             lambda: core.convert_file(path, output, settings, work_dir=output_dir),
+                             None, output)
+    stages.append(metrics)
+
+    return {
+        'fixture': name,
+        'settings': {key: settings[key] for key in ENGINE_SETTINGS},
+        'flags': ' '.join(engine.flags),
+        'stages': stages,
+    }
+
+
+def environment():
+    """Describe the machine and revision the numbers come from."""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                  capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = None
+    return {
+        'revision': revision or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'imageio': imageio.__version__,
+    }
+
+
+def case_key(case):
+    return case['fixture'], case['flags']
+
+
+def compare(old_report, new_report):
+    """Print per-stage wall time changes between two reports."""
+    old_cases = {case_key(case): case for case in old_report['cases']}
+    for case in new_report['cases']:
+        old = old_cases.get(case_key(case))
+        if old is None:
+            continue
+        old_stages = {stage['stage']: stage for stage in old['stages']}
+        for stage in case['stages']:
+            before = old_stages.get(stage['stage'])
+            if not before or not before['seconds']:
+                continue
+            change = (stage['seconds'] - before['seconds']) / before['seconds'] * 100
+            print(f'{case["fixture"]:<28} {case["flags"] or "-":<9} {stage["stage"]:<11} '
+                  f'{before["seconds"]:>9.3f}s -> {stage["seconds"]:>9.3f}s ({change:+.1f}%)',
+                  file=sys.stderr)
+
+
+def main(argv=None):
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(
+        prog='ascii-gen-benchmark',
+        description='Benchmark the ASCII image and video pipelines per stage.')
+    parser.add_argument('-o', '--output', help='Write the JSON report to a file')
+    parser.add_argument('--quick', action='store_true',
+                        help='Small fixtures and default settings only')
+    parser.add_argument('--fixture', action='append',
+                        help='Only run fixtures whose name contains this (repeatable)')
+    parser.add_argument('--compare', help='Previous JSON report to compare against')
+    args = parser.parse_args(argv)
+
+    cases = []
+    with tempfile.TemporaryDirectory(prefix='ascii-bench-') as work_dir:
+        fixture_dir = os.path.join(work_dir, 'fixtures')
+        output_dir = os.path.join(work_dir, 'outputs')
+        os.makedirs(fixture_dir)
+        os.makedirs(output_dir)
+        fixtures = build_fixtures(fixture_dir, args.quick)
+        if args.fixture:
+            fixtures = {name: path for name, path in fixtures.items()
+                        if any(part in name for part in args.fixture)}
+
+        for name, path in fixtures.items():
+            for settings in settings_combinations(args.quick):
+                case = bench_case(name, path, settings, output_dir)
+                cases.append(case)
+                total = sum(stage['seconds'] for stage in case['stages'])
+                print(f'{core.OK} {name} {case["flags"] or "-"}: {total:.2f}s', file=sys.stderr)
+
+    report = {'environment': environment(), 'cases': cases}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
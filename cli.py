@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Art Generator CLI - Headless conversion of images and videos
+Never imports tkinter, so it runs on servers without a display
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+
+import core
+from disk_cache import ConversionCache
+from core import ERROR, OK, INFO
+from metrics import PROFILE_MODES, create_telemetry
+
+
+# Text formats the main output can take instead of PNG/GIF
+OUTPUT_FORMATS = ('txt', 'ans', 'afs', 'html')
+
+
+def add_settings_arguments(parser):
+    """Add the options mirroring the GUI settings to a parser."""
+    parser.add_argument('-o', '--output-dir', default='output',
+                        help='Directory for results (default: output)')
+    parser.add_argument('-c', '--full-char', action='store_true',
+                        help='Use all available characters (bigger output)')
+    parser.add_argument('-C', '--color', action='store_true',
+                        help='Enable color generation mode')
+    parser.add_argument('-s', '--smol', action='store_true',
+                        help='Smaller, lower resolution output (SMOL™)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS,
+                        help='Main output as text instead of PNG/GIF (no pixels are rendered)')
+    parser.add_argument('--mp4', action='store_true',
+                        help='Also export videos as MP4')
+    parser.add_argument('--txt', action='store_true',
+                        help='Also export plain text (one file per frame for videos)')
+    parser.add_argument('--ans', action='store_true',
+                        help='Also export ANSI colored text (one file per frame for videos)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Also export a compressed character grid stream (.afs)')
+    parser.add_argument('--html', action='store_true',
+                        help='Also export a self-contained HTML player')
+    parser.add_argument('--keep-files', action='store_true',
+                        help='Keep source and rendered frames in <output>_frames/frames.store')
+    parser.add_argument('--open', action='store_true',
+                        help='Open each result in the native viewer')
+    parser.add_argument('-j', '--jobs', type=int, default=core.DEFAULT_SETTINGS['jobs'],
+                        help='Frames converted at once (default: every usable core, '
+                             'container CPU quotas included)')
+    parser.add_argument('--max-memory-mb', type=int,
+                        default=core.DEFAULT_SETTINGS['max_memory_mb'],
+                        help='Memory budget for frames in flight, capped to what is available')
+    parser.add_argument('--dedup-threshold', type=float,
+                        default=core.DEFAULT_SETTINGS['dedup_threshold'],
+                        help='Reuse frames differing by less than this fraction (0-1)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the persistent conversion cache')
+    parser.add_argument('--cache-dir', default=core.DEFAULT_SETTINGS['cache_dir'],
+                        help='Conversion cache location')
+    parser.add_argument('--cache-size-mb', type=int,
+                        default=core.DEFAULT_SETTINGS['cache_size_mb'],
+                        help='Evict least recently used cache entries past this size')
+
+    clip = parser.add_argument_group('clip and size (applied before decoding)')
+    clip.add_argument('--start', type=float, default=core.DEFAULT_SETTINGS['start'],
+                      metavar='SECONDS', help='Start converting at this time')
+    clip.add_argument('--end', type=float, default=core.DEFAULT_SETTINGS['end'],
+                      metavar='SECONDS', help='Stop converting at this time')
+    clip.add_argument('--max-duration', type=float,
+                      default=core.DEFAULT_SETTINGS['max_duration'], metavar='SECONDS',
+                      help='Convert at most this many seconds')
+    sampling = clip.add_mutually_exclusive_group()
+    sampling.add_argument('--stride', type=int, default=core.DEFAULT_SETTINGS['stride'],
+                          metavar='N', help='Keep every N-th frame')
+    sampling.add_argument('--fps', type=float, default=core.DEFAULT_SETTINGS['target_fps'],
+                          help='Resample to this frame rate (never above the source)')
+    clip.add_argument('--columns', type=int, default=core.DEFAULT_SETTINGS['columns'],
+                      help='Characters per row (overrides --smol)')
+    clip.add_argument('--rows', type=int, default=core.DEFAULT_SETTINGS['rows'],
+                      help='Character rows (default: keep the aspect ratio)')
+    clip.add_argument('--width', type=int, default=core.DEFAULT_SETTINGS['width'],
+                      metavar='PIXELS', help='Output width in pixels (instead of --columns)')
+    clip.add_argument('--tiled', action='store_true',
+                      help='Convert images in parallel strips with bounded memory and lift '
+                           "Pillow's size limit (automatic past 64 megapixels)")
+
+
+def add_telemetry_arguments(parser):
+    """Add the per-job metrics and profiling options to a parser."""
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='Append structured per-stage job events to a JSON-lines file')
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help='Capture a cProfile or tracemalloc profile of every job')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Where cProfile stats are written (default: profiles)')
+
+
+def build_parser():
+    """Build the argument parser mirroring the GUI options."""
+    parser = argparse.ArgumentParser(
+        prog='ascii-gen',
+        description='Convert images and videos to ASCII art.')
+    parser.add_argument('inputs', nargs='*', help='Image or video files to convert')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='Print conversion cache statistics as JSON')
+    parser.add_argument('--live', action='store_true',
+                        help='Play inputs as ANSI art in the terminal instead of writing files')
+    add_settings_arguments(parser)
+    add_telemetry_arguments(parser)
+    return parser
+
+
+def settings_from_args(args):
+    """Translate parsed arguments into a core settings dict."""
+    return core.resolve_settings({
+        'open_result': args.open,
+        'cleanup': not args.keep_files,
+        'full_char': args.full_char,
+        'color': args.color,
+        'full_scale': args.smol,
+        'export_mp4': args.mp4,
+        'export_txt': args.txt,
+        'export_ans': args.ans,
+        'export_stream': args.stream,
+        'export_html': args.html,
+        'max_memory_mb': args.max_memory_mb,
+        'jobs': args.jobs,
+        'dedup_threshold': args.dedup_threshold,
+        'cache': not args.no_cache,
+        'cache_dir': args.cache_dir,
+        'cache_size_mb': args.cache_size_mb,
+        'start': args.start,
+        'end': args.end,
+        'max_duration': args.max_duration,
+        'stride': args.stride,
+        'target_fps': args.fps,
+        'columns': args.columns,
+        'rows': args.rows,
+        'width': args.width,
+        'tiled': args.tiled,
+    })
+
+
+def output_extension(file_path, output_format=None):
+    """Extension of the main output: --format, else PNG for images and GIF for videos."""
+    if output_format:
+        return '.' + output_format
+    return '.png' if core.is_image(file_path) else '.gif'
+
+
+def output_path_for(file_path, output_dir, output_format=None, taken=None):
+    """Pick a per-input output path so many inputs never collide.
+
+    Exports and the work dir are named after the output's stem, so ``taken``
+    holds the stems handed out so far. A clashing input keeps its source
+    extension (x.jpg.png), then gets a numbered suffix (x.jpg-2.png).
+    """
+    name = os.path.basename(file_path)
+    stems = itertools.chain((os.path.splitext(name)[0], name),
+                            (f'{name}-{n}' for n in itertools.count(2)))
+    for stem in stems:
+        path = os.path.join(output_dir, stem)
+        key = os.path.normcase(os.path.abspath(path))
+        if taken is None or key not in taken:
+            break
+    if taken is not None:
+        taken.add(key)
+    return path + output_extension(file_path, output_format)
+
+
+def work_dir_for(output_path):
+    """Work dir for kept intermediate frames, unique as the output stem is."""
+    return os.path.splitext(output_path)[0] + '_frames'
+
+
+def play(inputs, settings, telemetry):
+    """Stream every input to the terminal. Returns the process exit code."""
+    import live
+
+    failed = 0
+    for file_path in inputs:
+        try:
+            if core.is_image(file_path):
+                live.print_image(file_path, settings)
+            elif core.is_video(file_path):
+                live.report(live.stream_video(file_path, settings, telemetry=telemetry))
+            else:
+                raise Exception('Unsupported file format!')
+        except Exception as e:
+            failed += 1
+            print(f'{ERROR} {file_path}: {e}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    """CLI entry point. Returns the process exit code."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    settings = settings_from_args(args)
+    core.setup_console()
+
+    if args.cache_stats:
+        cache = ConversionCache(settings['cache_dir'], settings['cache_size_mb'])
+        print(json.dumps(cache.stats(), indent=2))
+        if not args.inputs:
+            return 0
+    elif not args.inputs:
+        parser.error('at least one input file is required')
+
+    telemetry = create_telemetry(args.metrics, args.profile, args.profile_dir)
+    if args.live:
+        return play(args.inputs, settings, telemetry)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    taken = set()
+    for file_path in args.inputs:
+        print(f'{INFO} Converting {file_path}')
+        output_path = output_path_for(file_path, args.output_dir, args.format, taken)
+        # Each input gets its own work dir for kept intermediate frames
+        work_dir = work_dir_for(output_path)
+        try:
+            outputs = core.convert_file(file_path, output_path, settings,
+                                        work_dir=work_dir, telemetry=telemetry)
+            print(f'{OK} {file_path} -> {", ".join(outputs)}')
+        except Exception as e:
+            failed += 1
+            print(f'{ERROR} {file_path}: {e}')
+
+    print(f'{INFO} {len(args.inputs) - failed}/{len(args.inputs)} files converted.')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
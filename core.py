@@ -0,0 +1,711 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Core - Headless conversion pipeline for images and videos
+Importable without tkinter; used by the GUI, the CLI and batch tools
+"""
+
+import os
+import platform
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from termcolor import colored
+
+from ascii_engine import ASCIIEngine
+from disk_cache import ConversionCache
+from encoders import (GifWriter, ImageWriter, Mp4Writer, MultiWriter, StripImageWriter,
+                      glyph_palette)
+from frame_cache import FrameCache
+import frame_store
+from frame_store import CELLS, FrameStore
+from job_graph import STAGE_NAMES
+from metrics import Telemetry, path_bytes
+from probe import probe
+from scheduler import (ADAPT_INTERVAL, DEDUP_MEMORY_SHARE, IN_FLIGHT_MEMORY_SHARE,
+                       StageScheduler, available_cpus, memory_budget_mb)
+from settings import (DEFAULT_SETTINGS, SUPPORTED_IMAGE_FORMATS, SUPPORTED_VIDEO_FORMATS,
+                      is_image, is_video, resolve_settings)
+from text_formats import (STREAM_EXTENSION, FrameStreamWriter, HtmlPlayerWriter,
+                          TextFramesWriter, TextWriter)
+from video_reader import Clip, FrameReader, DEFAULT_MAX_MEMORY_MB
+
+
+TEXT_OUTPUT_FORMATS = ('.txt', '.ans', STREAM_EXTENSION, '.html')
+
+# Extra outputs next to the main one, by setting
+EXPORT_EXTENSIONS = (
+    ('export_mp4', '.mp4'),
+    ('export_txt', '.txt'),
+    ('export_ans', '.ans'),
+    ('export_stream', STREAM_EXTENSION),
+    ('export_html', '.html'),
+)
+# Per-frame text of videos goes to <stem>_txt/ and <stem>_ans/ directories
+FRAME_DIRECTORY_SUFFIXES = {'.txt': '_txt', '.ans': '_ans'}
+
+DEFAULT_IMAGE_OUTPUT = os.path.join('generated', 'output.png')
+
+# Images past this many source or output pixels are converted in strips
+TILED_IMAGE_PIXELS = 64 * 1024 * 1024
+# Source or output pixels handled by one strip task
+STRIP_PIXELS = 4 * 1024 * 1024
+# Pillow's decompression bomb limit is a global, lifted only while opening
+_IMAGE_LIMIT_LOCK = threading.Lock()
+DEFAULT_VIDEO_OUTPUT = 'output.gif'
+
+SYSTEM = platform.system()
+# Usable cores under affinity masks and container CPU quotas
+MAX_THREADS = available_cpus()
+
+ERROR = colored('[ERROR]', 'red')
+WARN = colored('[WARN]', 'yellow')
+OK = colored('[OK]', 'cyan')
+INFO = colored('[INFO]', 'green')
+
+
+def setup_console():
+    """Setup console colors for Windows."""
+    if SYSTEM == 'Windows':
+        os.system('color')
+
+
+class Reporter:
+    """Receives status and progress events from the conversion pipeline.
+
+    Stages are 'extract', 'convert' and 'encode'. The base class ignores
+    everything; front ends override the methods they care about.
+    """
+
+    def status(self, text, level='info'):
+        pass
+
+    def progress(self, stage, value, maximum=100):
+        pass
+
+
+def create_engine(settings):
+    """Build the ASCII engine for a settings dict."""
+    engine = ASCIIEngine(settings)
+
+    if '-f' in engine.flags:
+        print(f'{WARN} Using FULLSCALE generation')
+    if '-c' in engine.flags:
+        print(f'{WARN} Using FULLCHAR generation')
+    if '-C' in engine.flags:
+        print(f'{WARN} Using COLOR generation')
+
+    return engine
+
+
+def open_cache(settings):
+    """Open the persistent conversion cache, or None when disabled."""
+    if not settings['cache']:
+        return None
+    return ConversionCache(settings['cache_dir'], settings['cache_size_mb'])
+
+
+def output_paths(output_path, settings, video):
+    """The main output plus every extra output enabled in the settings."""
+    stem, extension = os.path.splitext(output_path)
+    paths = []
+    for path in [output_path] + [stem + extra for key, extra in EXPORT_EXTENSIONS
+                                 if settings[key] and extra != extension.lower()
+                                 and (video or extra != '.mp4')]:
+        extra = os.path.splitext(path)[1].lower()
+        if video and extra in FRAME_DIRECTORY_SUFFIXES:
+            path = stem + FRAME_DIRECTORY_SUFFIXES[extra]
+        paths.append(path)
+    return paths
+
+
+def artifact_name(output_path):
+    """Name an output is stored under inside a cache entry."""
+    return 'output' + os.path.splitext(output_path)[1].lower()
+
+
+def clear_directory(directory):
+    """Create a directory if needed and remove the files inside it."""
+    os.makedirs(directory, exist_ok=True)
+    for file in os.listdir(directory):
+        try:
+            os.remove(os.path.join(directory, file))
+        except OSError:
+            pass
+
+
+def remove_empty_directory(directory):
+    """Remove a work directory if nothing is left in it."""
+    try:
+        os.rmdir(directory)
+    except OSError:
+        pass
+
+
+def remove_outputs(paths):
+    """Delete partial outputs: files, or per-frame text directories. Never raises."""
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f'{WARN} Could not remove {path}: {e}')
+
+
+def open_result(file_path):
+    """Open a result in the native viewer."""
+    print(f'{INFO} Launching viewer for {file_path}.')
+    if SYSTEM == 'Windows':
+        os.startfile(file_path)
+    else:
+        os.system(f'xdg-open "{file_path}"')
+
+
+def report_reuse(telemetry, reused):
+    """Print and record which job graph stages were reused from the cache."""
+    redone = STAGE_NAMES[STAGE_NAMES.index(reused[-1]) + 1:]
+    print(f'{OK} Reusing {" and ".join(reused)} from cache, redoing {", ".join(redone)}.')
+    telemetry.event('graph', reused=list(reused), redone=list(redone))
+
+
+def open_image(file_path, tiled=False):
+    """Open an image lazily. Tiled mode lifts Pillow's decompression bomb limit."""
+    if not tiled:
+        try:
+            return Image.open(file_path)
+        except Image.DecompressionBombError as e:
+            raise Exception(f'{e} Use tiled mode (--tiled) for images this large.')
+    with _IMAGE_LIMIT_LOCK:
+        limit, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+        try:
+            return Image.open(file_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+
+def is_huge(image, engine):
+    """True when the source or the rendered output is too big to hold at once."""
+    columns, rows = engine.grid_size(*image.size)
+    output = columns * engine.cell_w * rows * engine.cell_h
+    return max(image.width * image.height, output) > TILED_IMAGE_PIXELS
+
+
+def strip_bounds(length, strip, jobs):
+    """(start, end) ranges covering ``length`` rows, at most ``strip`` rows each.
+
+    Strips are also kept small enough for every worker to get several.
+    """
+    strip = max(1, min(strip, -(-length // (4 * jobs))))
+    return [(start, min(length, start + strip)) for start in range(0, length, strip)]
+
+
+def ordered_results(executor, function, items, window):
+    """Yield function(item) for every item in order, with at most ``window`` in flight."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_frame(engine, writer, grid):
+    """Rasterize a grid for the writer: palette indices when it has a palette."""
+    if writer.palette is not None:
+        return engine.render_indexed(*grid, writer.palette)
+    return engine.render(*grid)
+
+
+def convert_file(file_path, output_path=None, settings=None, reporter=None, work_dir='.',
+                 telemetry=None):
+    """Convert an image or video, dispatching on the file extension.
+
+    With a ``telemetry`` (see metrics.py), the job is wrapped in job_start/
+    job_end events and every stage reports structured timings.
+    """
+    telemetry = telemetry or Telemetry()
+    with telemetry.job(file_path) as job:
+        if is_image(file_path):
+            job['outputs'] = convert_image(file_path, output_path, settings, reporter, telemetry)
+        elif is_video(file_path):
+            job['outputs'] = convert_video(file_path, output_path, settings, reporter, work_dir,
+                                           telemetry)
+        else:
+            raise Exception('Unsupported file format!')
+    return job['outputs']
+
+
+def convert_image(file_path, output_path=None, settings=None, reporter=None, telemetry=None):
+    """Convert a single image file. Returns the list of written outputs."""
+    settings = resolve_settings(settings)
+    reporter = reporter or Reporter()
+    telemetry = telemetry or Telemetry()
+    output_path = output_path or DEFAULT_IMAGE_OUTPUT
+
+    reporter.status('Processing image...')
+    cache = open_cache(settings)
+    keys = cache.keys(file_path, settings) if cache else None
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    wanted = output_paths(output_path, settings, video=False)
+    missing = [path for path in wanted
+               if not (cache and cache.fetch_artifact(keys['encode'], artifact_name(path),
+                                                      path))]
+    if cache:
+        telemetry.event('cache', kind='artifact', hits=len(wanted) - len(missing),
+                        misses=len(missing))
+
+    if not missing:
+        print(f'{OK} Loaded from cache.')
+    else:
+        engine = create_engine(settings)
+        cached = cache.load_cells(keys['downscale']) if cache else None
+        if cache:
+            telemetry.event('cache', kind='cells', hits=int(cached is not None),
+                            misses=int(cached is None))
+        cells = None
+        if cached is not None:
+            # Only charset, color or output options changed: skip decoding
+            with cached:
+                cells = cached.get(CELLS, 0).copy()
+            report_reuse(telemetry, ('decode', 'downscale'))
+        decoded = cells is None
+
+        # Opening only reads the header; pixels are decoded on demand
+        with open_image(file_path, settings['tiled']) as image:
+            if settings['tiled'] or is_huge(image, engine):
+                print(f'{INFO} Converting the {image.width}x{image.height} image in strips.')
+                cells = convert_tiled(image, engine, missing, reporter, telemetry,
+                                      settings['jobs'] or MAX_THREADS, cells)
+            else:
+                writer = open_writers(missing, None, engine)
+                if cells is None:
+                    with telemetry.stage('extract'):
+                        image.load()
+                        cells = engine.to_cells(image)
+                with telemetry.stage('convert', frames=1):
+                    grid = engine.cells_to_grid(cells)
+                    # Text-only outputs never rasterize glyphs
+                    result = render_frame(engine, writer, grid) if writer.needs_pixels else None
+                writer.write(result, 0, grid)
+                writer.close()
+                report_writers(writer, telemetry)
+        if cache and decoded:
+            cells_writer = cache.cells_writer(keys['downscale'])
+            cells_writer.append(cells)
+            cells_writer.commit()
+        if cache:
+            for path in missing:
+                cache.store_artifact(keys['encode'], artifact_name(path), path)
+
+    for stage in ('extract', 'convert', 'encode'):
+        reporter.progress(stage, 100)
+
+    for path in wanted:
+        print(f'{INFO} Saved as "{path}"')
+    if settings['open_result']:
+        open_result(output_path)
+
+    reporter.status('Image conversion complete!')
+    return wanted
+
+
+def convert_tiled(image, engine, paths, reporter, telemetry, jobs, cells=None):
+    """Convert a very large image in horizontal strips across cores. Returns its cells.
+
+    JPEGs are decoded at the smallest DCT scale still covering the grid
+    (Pillow draft mode); other formats are decoded whole by Pillow. Bands
+    of source rows are then averaged down to the grid width in parallel,
+    converting only one band at a time to RGB. The cells are rendered in
+    parallel strips of grid rows, and image outputs are written strip by
+    strip (see StripImageWriter), so the rendered image is never held
+    whole. The progress bars advance per band and per strip.
+    """
+    columns, rows = engine.grid_size(*image.size)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        if cells is None:
+            with telemetry.stage('extract') as stage:
+                image.draft('RGB', (columns, rows))
+                image.load()
+                bands = strip_bounds(image.height, STRIP_PIXELS // image.width, jobs)
+                stage.update(strips=len(bands), decoded_size=f'{image.width}x{image.height}')
+                narrowed = []
+                results = ordered_results(
+                    executor, lambda band: engine.narrow_band(image, columns, *band),
+                    bands, 2 * jobs)
+                for narrow in results:
+                    narrowed.append(narrow)
+                    reporter.progress('extract', len(narrowed), len(bands))
+                cells = engine.cells_from_bands(narrowed, rows)
+        reporter.progress('extract', 1, 1)
+
+        pixel_paths = [path for path in paths if path.lower().endswith(SUPPORTED_IMAGE_FORMATS)]
+        writer = MultiWriter([StripImageWriter(path, columns * engine.cell_w,
+                                               rows * engine.cell_h)
+                              for path in pixel_paths])
+        strips = strip_bounds(rows, STRIP_PIXELS // (columns * engine.cell_w * engine.cell_h),
+                              jobs)
+        rendered = []  # strips done (list.append is thread-safe)
+
+        def render_strip(strip):
+            result = engine.render(*engine.cells_to_grid(cells[strip[0]:strip[1]]))
+            rendered.append(strip)
+            return result
+
+        with telemetry.stage('convert', frames=1, strips=len(strips)):
+            if writer.writers:
+                results = ordered_results(executor, render_strip, strips, 2 * jobs)
+                for index, result in enumerate(results):
+                    writer.write(result, 0)
+                    reporter.progress('convert', len(rendered), len(strips))
+                    reporter.progress('encode', index + 1, len(strips))
+            writer.close()
+    report_writers(writer, telemetry)
+
+    # Text outputs take the whole character grid, which is small
+    text = open_writers([path for path in paths if path not in pixel_paths], None, engine)
+    text.write(None, 0, engine.cells_to_grid(cells))
+    text.close()
+    report_writers(text, telemetry)
+    return cells
+
+
+def convert_video(file_path, output_path=None, settings=None, reporter=None, work_dir='.',
+                  telemetry=None):
+    """Convert a video/GIF file. Returns the list of written outputs."""
+    settings = resolve_settings(settings)
+    reporter = reporter or Reporter()
+    telemetry = telemetry or Telemetry()
+    output_path = output_path or DEFAULT_VIDEO_OUTPUT
+    keep_files = not settings['cleanup']
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    reporter.status('Generating ASCII art...')
+    wanted = output_paths(output_path, settings, video=True)
+
+    # Kept intermediate files need a real run, so the cache is write-only then
+    cache = open_cache(settings)
+    keys = cache.keys(file_path, settings) if cache else None
+    key = keys['encode'] if cache else None
+    use_cached = cache is not None and not keep_files
+
+    if use_cached and all(cache.has_artifact(key, artifact_name(path)) for path in wanted):
+        for path in wanted:
+            cache.fetch_artifact(key, artifact_name(path), path)
+        telemetry.event('cache', kind='artifact', hits=len(wanted), misses=0)
+        for stage in ('extract', 'convert', 'encode'):
+            reporter.progress(stage, 100)
+        print(f'{OK} All outputs loaded from cache.')
+        outputs = wanted
+    else:
+        engine = create_engine(settings)
+        # Decoded, downscaled cells are shared by every charset and color choice
+        cells = cache.load_cells(keys['downscale']) if use_cached else None
+
+        # Outputs already in the cache are copied, only missing ones are encoded
+        missing = [path for path in wanted
+                   if not (use_cached and cache.fetch_artifact(key, artifact_name(path), path))]
+        if cache:
+            telemetry.event('cache', kind='artifact', hits=len(wanted) - len(missing),
+                            misses=len(missing))
+            telemetry.event('cache', kind='cells', hits=int(cells is not None),
+                            misses=int(cells is None))
+
+        with telemetry.stage('probe') as stage:
+            info = probe(file_path)
+            # Fix the grid from the source size so the decoder can scale to it
+            engine.fix_grid(info.width, info.height)
+            # Kept frames are saved at full size, otherwise ffmpeg downscales
+            clip = Clip.from_settings(
+                settings, None if keep_files else (engine.columns, engine.rows))
+            source_fps = info.fps
+            info = clip.plan(info, gif=file_path.lower().endswith('.gif'))
+            stage.update(frames=info.frame_count, fps=round(info.fps, 3))
+        print(f'{INFO} Probed {info}. Encoding {", ".join(missing)} in a single pass.')
+        writer = open_writers(missing, info.fps, engine)
+        cells_writer = None
+
+        try:
+            if cells is not None:
+                # Only charset, color or output options changed: skip decoding
+                report_reuse(telemetry, ('decode', 'downscale'))
+                with cells, telemetry.stage('convert', frames=cells.complete([CELLS]),
+                                            source='cache'):
+                    render_cells(cells, engine, reporter, writer, info,
+                                 settings['jobs'] or MAX_THREADS)
+            else:
+                # Grids are committed to a frame store as they are produced, so
+                # an interrupted job resumes; source and rendered frames are
+                # only kept in it when the user keeps intermediate files
+                store = FrameStore(os.path.join(work_dir, frame_store.STORE_NAME),
+                                   frame_store.job_signature(file_path, settings))
+
+                # Decode, convert and encode as a stream with bounded memory
+                # The budget is shared by the prefetch queue and frames in flight
+                budget = memory_budget_mb(settings['max_memory_mb'])
+                prefetch_mb = max(1, int(budget * (1 - IN_FLIGHT_MEMORY_SHARE)))
+                # Cells stream into the cache as frames are converted
+                cells_writer = cache.cells_writer(keys['downscale']) if cache else None
+                with store, FrameReader(file_path, prefetch_mb, info.frame_count,
+                                        clip, source_fps) as reader:
+                    print(f'{INFO} Streaming frames with a {budget} MB memory budget.')
+                    frames = convert_frames_to_ascii(
+                        reader, engine, reporter, writer, info, store, keep_files,
+                        settings['dedup_threshold'], telemetry,
+                        settings['jobs'] or MAX_THREADS, budget, cells_writer)
+                if not frames:
+                    # The probe can overestimate the length: never report success
+                    raise Exception(f'No frames decoded from {os.path.basename(file_path)}')
+                if cells_writer is not None:
+                    cells_writer.commit()
+                if keep_files:
+                    print(f'{INFO} Kept {frames} source and rendered frames in {store.path}')
+                else:
+                    store.remove()
+                    remove_empty_directory(work_dir)
+        except BaseException:
+            # Never leave truncated outputs behind, even when interrupted.
+            # A failing cleanup step must not hide the original error.
+            for cleanup in (cells_writer and cells_writer.discard, writer.close):
+                try:
+                    if cleanup:
+                        cleanup()
+                except Exception as e:
+                    print(f'{WARN} Cleanup after a failed job: {e}')
+            remove_outputs(writer.paths)
+            raise
+
+        writer.close()
+        for path, error in writer.failed.items():
+            print(f'{WARN} {os.path.basename(path)} creation failed, other outputs kept: {error}')
+        report_writers(writer, telemetry)
+        reporter.progress('encode', 1, 1)
+        for path in writer.paths:
+            print(f'{OK} Saved as {path}')
+            # Per-frame text directories are cheap to rebuild from cached cells
+            if cache and os.path.isfile(path):
+                cache.store_artifact(key, artifact_name(path), path)
+        outputs = [path for path in wanted if os.path.exists(path)]
+
+    if settings['open_result']:
+        for output in outputs:
+            open_result(output)
+
+    reporter.status('Generation complete!')
+    print(f'{OK} Generation complete!')
+    return outputs
+
+
+def convert_frames_to_ascii(reader, engine, reporter, writer, info,
+                            store=None, keep_frames=False, dedup_threshold=0.0,
+                            telemetry=None, jobs=None, memory_mb=DEFAULT_MAX_MEMORY_MB,
+                            cells=None):
+    """Convert streamed frames to ASCII art and feed them to the writer in order.
+
+    Each frame keeps its own display time from the probed ``info``.
+
+    Returns the number of frames. Nothing is kept per frame: every grid
+    goes to the writer and the store, and with a ``cells`` CellsWriter (see
+    disk_cache.py) every frame's downscaled cells are appended to it in
+    order (None for monochrome frames resumed from the store).
+    Duplicate frames are converted once (see FrameCache). Every grid is committed to the
+    FrameStore ``store``, plus the source and rendered frames with
+    ``keep_frames``. Frames an interrupted run already committed are
+    rendered from their stored grid instead of being converted again.
+    Decode, extract and convert timings go to ``telemetry``.
+
+    Up to ``jobs`` frames convert at once; a StageScheduler lowers that
+    when decoding or encoding is the bottleneck, and bounds the frames in
+    flight by ``memory_mb``.
+    """
+    telemetry = telemetry or Telemetry()
+    scheduler = StageScheduler(jobs or MAX_THREADS, memory_mb)
+    total_frames = reader.length or 0
+    pending = deque()
+    collected = 0
+    cache = FrameCache(dedup_threshold)
+    busy = []  # per-frame worker seconds (list.append is thread-safe)
+    depth_max = 0
+    render = writer.needs_pixels or keep_frames
+
+    kinds = [frame_store.INDICES]
+    if engine.color:
+        kinds.append(frame_store.COLORS)
+    if keep_frames:
+        kinds += [frame_store.SOURCE, frame_store.RENDERED]
+    resumed = store.complete(kinds) if store is not None else 0
+    if resumed:
+        print(f'{INFO} Resuming: {resumed} frames already converted.')
+
+    def process_frame(frame):
+        start = time.perf_counter()
+        frame_cells = engine.to_cells(frame)
+        grid = engine.cells_to_grid(frame_cells)
+        # Text-only outputs never rasterize glyphs
+        result = render_frame(engine, writer, grid) if render else None
+        busy.append(time.perf_counter() - start)
+        return frame_cells, grid, result
+
+    def resume_frame(index):
+        grid = store.grid(index)
+        # Color grids keep the cells as their colors
+        return grid[1], grid, render_frame(engine, writer, grid) if writer.needs_pixels else None
+
+    def commit(index, frame, grid, result):
+        """Append a frame to the store; its indices record goes last."""
+        if keep_frames:
+            store.append(frame_store.SOURCE, index, frame)
+            store.append(frame_store.RENDERED, index, writer.to_rgb(result))
+        if grid[1] is not None:
+            store.append(frame_store.COLORS, index, grid[1])
+        store.append(frame_store.INDICES, index, grid[0], info.frame_duration(index))
+
+    def collect(decoded):
+        nonlocal collected
+        future, frame = pending.popleft()
+        frame_cells, grid, result = future.result()
+        index = collected
+        writer.write(result, info.frame_duration(index), grid)
+        if store is not None and index >= resumed:
+            commit(index, frame, grid, result)
+        if cells is not None:
+            cells.append(frame_cells)
+        collected += 1
+        maximum = max(total_frames, decoded)
+        reporter.progress('convert', collected, maximum)
+        reporter.progress('encode', collected, maximum)
+
+    decoded = 0
+    worker_counts = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=scheduler.max_workers) as executor:
+        for frame in reader:
+            if not decoded:
+                columns, rows = engine.grid_size(frame.shape[1], frame.shape[0])
+                rendered = rows * engine.cell_h * columns * engine.cell_w if render else 0
+                # Palette-indexed frames take one byte per pixel instead of three
+                rendered *= 1 if writer.palette is not None else 3
+                scheduler.observe_frame(frame.nbytes + rendered)
+                # A cached conversion holds the cells, the grid and the rendered frame
+                cache.limit(rows * columns * 4 + rendered,
+                            int(memory_mb * 1024 * 1024 * DEDUP_MEMORY_SHARE))
+            if decoded < resumed:
+                future = executor.submit(resume_frame, decoded)
+            else:
+                future = cache.get_or_submit(
+                    frame, lambda frame: executor.submit(process_frame, frame))
+            pending.append((future, frame if keep_frames else None))
+            decoded += 1
+            depth_max = max(depth_max, len(pending))
+            scheduler.observe_cache(cache.nbytes)
+            reporter.progress('extract', decoded, max(total_frames, decoded))
+
+            if decoded % ADAPT_INTERVAL == 0 and busy and collected:
+                worker_counts.append(scheduler.adapt(
+                    sum(busy) / len(busy),
+                    reader.decode_seconds / reader.frames_decoded,
+                    sum(writer.seconds.values()) / collected))
+
+            # Bound the frames in flight and the frames converting at once
+            while pending and (len(pending) >= scheduler.window or
+                               sum(not future.done() for future, _ in pending)
+                               >= scheduler.workers):
+                collect(decoded)
+
+        while pending:
+            collect(decoded)
+
+    elapsed = time.perf_counter() - start
+    reporter.progress('extract', decoded, decoded)
+    print(f'{OK} All {decoded} frames processed, {cache.hits} duplicates reused.')
+
+    if telemetry.enabled:
+        telemetry.event('stage', stage='decode', seconds=round(reader.decode_seconds, 4),
+                        frames=reader.frames_decoded)
+        telemetry.event('stage', stage='extract', seconds=round(reader.wait_seconds, 4),
+                        frames=decoded, queue_capacity=reader.prefetch,
+                        queue_depth_mean=round(reader.depth_mean, 2),
+                        queue_depth_max=reader.depth_max)
+        lookups = cache.hits + cache.misses
+        telemetry.event('stage', stage='convert', seconds=round(elapsed, 4),
+                        frames=decoded, converted=cache.misses,
+                        workers=scheduler.max_workers,
+                        workers_mean=round(sum(worker_counts) / len(worker_counts), 2)
+                        if worker_counts else scheduler.workers,
+                        busy_seconds=round(sum(busy), 4),
+                        utilization=round(sum(busy) / (elapsed * scheduler.max_workers), 3)
+                        if elapsed else 0.0,
+                        pending_max=depth_max, dedup_hits=cache.hits,
+                        dedup_hit_rate=round(cache.hits / lookups, 3) if lookups else 0.0)
+    return collected
+
+
+def render_cells(cells, engine, reporter, writer, info, jobs=None):
+    """Map cached cells to grids with the engine's charset, render and feed the writer.
+
+    ``cells`` is the FrameStore from ConversionCache.load_cells; frames
+    are read from it as they are rendered, a bounded window at a time.
+    """
+    jobs = jobs or MAX_THREADS
+    count = cells.complete([CELLS])
+    reporter.progress('extract', count, count)
+    render = writer.needs_pixels
+
+    def process(index):
+        grid = engine.cells_to_grid(cells.get(CELLS, index))
+        return grid, render_frame(engine, writer, grid) if render else None
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = ordered_results(executor, process, range(count), 2 * jobs)
+        for index, (grid, result) in enumerate(results):
+            writer.write(result, info.frame_duration(index), grid)
+            reporter.progress('convert', index + 1, count)
+            reporter.progress('encode', index + 1, count)
+
+
+def report_writers(writer, telemetry):
+    """Emit encode (and GIF optimize) timings and sizes for every output."""
+    for output in writer.writers:
+        telemetry.event('stage', stage='encode', output=output.path,
+                        seconds=round(writer.seconds[output.path], 4),
+                        bytes=path_bytes(output.path))
+        if isinstance(output, GifWriter):
+            telemetry.event('stage', stage='optimize', output=output.path,
+                            seconds=round(output.optimize_seconds, 4),
+                            frames_written=output.frames_written)
+
+
+def open_writers(paths, fps, engine):
+    """Open one incremental writer per output path, chosen by extension."""
+    writers = []
+    palette = None
+    for path in paths:
+        name = path.lower()
+        if name.endswith('.mp4'):
+            try:
+                writers.append(Mp4Writer(path, fps))
+            except Exception as e:
+                print(f'{ERROR} MP4 creation failed: {e}')
+        elif name.endswith(('.txt', '.ans')):
+            writers.append(TextWriter(path, engine.charset, ansi=name.endswith('.ans')))
+        elif name.endswith(tuple(FRAME_DIRECTORY_SUFFIXES.values())):
+            writers.append(TextFramesWriter(path, engine.charset, ansi=name.endswith('_ans')))
+        elif name.endswith(STREAM_EXTENSION):
+            writers.append(FrameStreamWriter(path, engine.charset, engine.color))
+        elif name.endswith('.html'):
+            writers.append(HtmlPlayerWriter(path, engine.charset, engine.color))
+        elif name.endswith(SUPPORTED_IMAGE_FORMATS):
+            writers.append(ImageWriter(path))
+        else:
+            palette = palette or glyph_palette(engine.color, engine.levels)
+            writers.append(GifWriter(path, palette, (engine.cell_h, engine.cell_w)))
+    # Render straight to GIF palette indices unless an output needs truecolor
+    if any(not (writer.grid_input or writer.palette_input) for writer in writers):
+        palette = None
+    return MultiWriter(writers, palette)
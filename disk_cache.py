@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Disk Cache - Persistent, content-addressed conversion cache
+Entries are keyed by job graph stage, so jobs differing late share early stages
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+from frame_store import CELLS, FrameStore
+from job_graph import stage_keys
+from settings import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB
+
+
+CELLS_NAME = 'cells.store'
+STATS_NAME = 'stats.json'
+CHUNK_SIZE = 1024 * 1024
+# Entry directories are named after a stage key (a SHA-1 hex digest);
+# nothing else in the cache dir is ever sized or evicted
+ENTRY_NAME = re.compile(r'[0-9a-f]{40}')
+
+
+def file_hash(file_path):
+    """BLAKE2 hash of a file's contents, read in chunks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _directory_size(path):
+    """Total size of the files under a directory, nested ones included."""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def _write_atomic(directory, name, write):
+    """Write ``name`` through a unique temp file renamed into place.
+
+    Concurrent jobs storing the same entry each get their own temp file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, os.path.join(directory, name))
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CellsWriter:
+    """Streams the cells of a job into a cache entry, one frame at a time.
+
+    Frames go to a unique temp FrameStore as they are converted, so no
+    frame is kept in memory. commit() renames the store into place. It
+    discards it instead if a frame had no cells (monochrome frames resumed
+    from a job's store).
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.directory = cache._entry(key)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix=CELLS_NAME + '.', suffix='.tmp')
+        os.close(fd)
+        self.store = FrameStore(path)
+        self.count = 0
+        self.complete = True
+
+    def append(self, cells):
+        if cells is None:
+            self.complete = False
+        elif self.complete:
+            self.store.append(CELLS, self.count, cells)
+        self.count += 1
+
+    def commit(self):
+        """Publish the cells if every frame had some. Returns True when stored."""
+        if not (self.complete and self.count):
+            self.discard()
+            return False
+        self.store.close()
+        os.replace(self.store.path, os.path.join(self.directory, CELLS_NAME))
+        self.cache.evict()
+        return True
+
+    def discard(self):
+        self.store.remove()
+
+
+class ConversionCache:
+    """Stores the downscaled cells and final artifacts of finished jobs.
+
+    Each entry is a directory named after a job graph stage key (see
+    job_graph.py): cells under the downscale stage, outputs under the
+    encode stage. A charset or color change therefore still finds the
+    cells and only redoes glyph mapping, rendering and encoding. Reading an entry
+    refreshes its mtime, and the least recently used entries are evicted
+    once the cache grows past ``max_size_mb``.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_size_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def keys(self, file_path, settings):
+        """Stage keys of a source file converted with the given settings."""
+        return stage_keys(file_hash(file_path), settings)
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _touch(self, key):
+        os.utime(self._entry(key))
+
+    def load_cells(self, key):
+        """Open the cached cells of a job, or None.
+
+        Returns a FrameStore holding one CELLS record, a (rows, columns, 3)
+        array, per frame. Frames are read lazily from its memory map.
+        """
+        path = os.path.join(self._entry(key), CELLS_NAME)
+        if not os.path.exists(path):
+            self._count('misses')
+            return None
+        store = FrameStore(path, job=None)
+        if not store.complete([CELLS]):
+            store.close()
+            self._count('misses')
+            return None
+        self._touch(key)
+        self._count('hits')
+        return store
+
+    def cells_writer(self, key):
+        """A CellsWriter storing the block-averaged RGB cells of a job."""
+        return CellsWriter(self, key)
+
+    def fetch_artifact(self, key, name, destination):
+        """Copy a cached artifact to ``destination``. Returns True on a hit."""
+        path = os.path.join(self._entry(key), name)
+        if not os.path.exists(path):
+            self._count('misses')
+            return False
+        os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+        shutil.copyfile(path, destination)
+        self._touch(key)
+        self._count('hits')
+        return True
+
+    def has_artifact(self, key, name):
+        return os.path.exists(os.path.join(self._entry(key), name))
+
+    def store_artifact(self, key, name, source):
+        """Copy a finished output into the cache entry."""
+        os.makedirs(self._entry(key), exist_ok=True)
+
+        def copy(f):
+            with open(source, 'rb') as source_file:
+                shutil.copyfileobj(source_file, f, CHUNK_SIZE)
+
+        _write_atomic(self._entry(key), name, copy)
+        self.evict()
+
+    def _entries(self):
+        """All entries as (mtime, size, path), oldest first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if ENTRY_NAME.fullmatch(name) and os.path.isdir(path):
+                entries.append((os.path.getmtime(path), _directory_size(path), path))
+        return sorted(entries)
+
+    def evict(self):
+        """Remove least recently used entries until under the size limit."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def _count(self, field):
+        """Bump a persistent hit/miss counter (best effort)."""
+        stats = self._read_stats()
+        stats[field] = stats.get(field, 0) + 1
+        try:
+            _write_atomic(self.cache_dir, STATS_NAME,
+                          lambda f: f.write(json.dumps(stats).encode('utf-8')))
+        except OSError:
+            pass
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, STATS_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stats(self):
+        """Summary of the cache contents and hit rate."""
+        entries = self._entries()
+        counters = self._read_stats()
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        return {
+            'cache_dir': self.cache_dir,
+            'entries': len(entries),
+            'size_mb': round(sum(size for _, size, _ in entries) / (1024 * 1024), 2),
+            'max_size_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'oldest_entry': (time.strftime('%Y-%m-%d %H:%M:%S',
+                                           time.localtime(entries[0][0]))
+                             if entries else None),
+        }
@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+"""
+Encoders - Single-pass, incremental output writers
+One frame stream feeds an optimizing GIF writer and an ffmpeg MP4 pipe
+"""
+
+import io
+import os
+import struct
+import time
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+
+# 5 bits per channel for the RGB -> palette index lookup table
+LUT_BITS = 5
+
+
+class Palette:
+    """A global GIF palette plus a fast frame -> index mapping.
+
+    The entry after the last color is reserved as the transparent index
+    used by frame-diff sub-rectangles.
+    """
+
+    def __init__(self, colors, gray_levels=None):
+        self.colors = np.asarray(colors, dtype=np.uint8)
+        self.transparent = len(self.colors)
+        if self.transparent > 255:
+            raise ValueError('Palette needs a free slot for transparency')
+        # Bits of the global color table (colors + transparent slot)
+        self.bits = max(1, int(np.ceil(np.log2(self.transparent + 1))))
+
+        if gray_levels is not None:
+            # Monochrome frames: map the gray level of one channel to the
+            # nearest palette gray
+            gray_levels = np.asarray(gray_levels, dtype=np.int16)
+            distance = np.abs(np.arange(256, dtype=np.int16)[:, None] - gray_levels[None, :])
+            self.gray_lut = distance.argmin(axis=1).astype(np.uint8)
+            self.lut = None
+        else:
+            self.gray_lut = None
+            self.lut = build_lut(self.colors.tobytes())
+        self._shades = {}
+
+    @property
+    def table(self):
+        """Color table bytes padded to 2**bits entries."""
+        table = np.zeros((1 << self.bits, 3), dtype=np.uint8)
+        table[:len(self.colors)] = self.colors
+        return table.tobytes()
+
+    def index(self, frame):
+        """Map an RGB frame to palette indices."""
+        if self.gray_lut is not None:
+            return self.gray_lut[frame[:, :, 0]]
+        shift = 8 - LUT_BITS
+        r = frame[:, :, 0].astype(np.uint16) >> shift
+        g = frame[:, :, 1].astype(np.uint16) >> shift
+        b = frame[:, :, 2] >> shift
+        return self.lut[(r << (2 * LUT_BITS)) | (g << LUT_BITS) | b]
+
+    def shades(self, levels):
+        """(colors, levels) table: palette index of each color drawn at each glyph alpha.
+
+        Monochrome palettes have a single row, for white glyphs.
+        """
+        key = levels.tobytes()
+        if key not in self._shades:
+            if self.gray_lut is not None:
+                table = self.gray_lut[levels][None, :]
+            else:
+                tint = self.colors[:, None, :].astype(np.uint16) * levels[None, :, None]
+                table = self.index(((tint + 127) // 255).astype(np.uint8))
+            table.setflags(write=False)
+            self._shades[key] = table
+        return self._shades[key]
+
+    def expand(self, indices):
+        """RGB frame of a palette-indexed frame."""
+        return self.colors[indices]
+
+
+@lru_cache(maxsize=8)
+def build_lut(palette_bytes):
+    """Nearest palette entry for every quantized RGB value."""
+    colors = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    levels = np.arange(1 << LUT_BITS, dtype=np.int32) << (8 - LUT_BITS)
+    levels += 1 << (7 - LUT_BITS)  # bucket centers
+    r, g, b = np.meshgrid(levels, levels, levels, indexing='ij')
+    rgb = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    lut = np.empty(len(rgb), dtype=np.uint8)
+    for start in range(0, len(rgb), 4096):
+        chunk = rgb[start:start + 4096, None, :] - colors[None, :, :]
+        lut[start:start + 4096] = np.argmin((chunk * chunk).sum(axis=2), axis=1)
+    return lut
+
+
+def glyph_palette(color, levels=None):
+    """Minimal global palette for rendered ASCII frames.
+
+    Monochrome glyphs are white on black, so the only pixel values are the
+    glyph alpha levels (see get_level_atlas). Color mode uses a 6x7x6
+    color cube plus three mid grays.
+    """
+    if not color:
+        if levels is None:
+            levels = np.arange(255, dtype=np.uint8)
+        return Palette(np.stack([levels] * 3, axis=1), gray_levels=levels)
+
+    r, g, b = np.meshgrid(np.linspace(0, 255, 6), np.linspace(0, 255, 7),
+                          np.linspace(0, 255, 6), indexing='ij')
+    cube = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+    grays = np.array([[64] * 3, [128] * 3, [192] * 3])
+    return Palette(np.rint(np.concatenate([cube, grays])))
+
+
+def lzw_image_data(indices, table):
+    """LZW-compress an index frame using Pillow's encoder.
+
+    Returns the GIF table-based image data (minimum code size byte plus
+    data sub-blocks), ready to follow an image descriptor.
+    """
+    image = Image.frombuffer('P', indices.shape[::-1], np.ascontiguousarray(indices),
+                             'raw', 'P', 0, 1)
+    image.putpalette(table)
+    buffer = io.BytesIO()
+    image.save(buffer, 'GIF', optimize=False, interlace=False)
+    data = buffer.getvalue()
+
+    # Skip header, screen descriptor and global color table
+    position = 13
+    if data[10] & 0x80:
+        position += 3 << ((data[10] & 0x07) + 1)
+    # Skip extensions up to the image descriptor
+    while data[position] == 0x21:
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+    flags = data[position + 9]
+    position += 10
+    if flags & 0x80:
+        position += 3 << ((flags & 0x07) + 1)
+
+    start = position
+    position += 1
+    while data[position]:
+        position += data[position] + 1
+    return data[start:position + 1]
+
+
+class GifWriter:
+    """Streams frames into an optimized GIF that shares one global palette.
+
+    Runs of identical consecutive frames are merged into a single frame
+    with the summed duration. After the first frame, only the bounding
+    box of changed character cells is stored, with unchanged pixels made
+    transparent whenever that compresses better. Frames may be RGB or
+    already indexed into the palette (2-D).
+    """
+
+    grid_input = False
+    palette_input = True
+
+    def __init__(self, path, palette, cell_size=(1, 1), loop=0):
+        self.path = path
+        self.palette = palette
+        self.cell_h, self.cell_w = cell_size
+        self.loop = loop
+        self.file = None
+        self.pending = None
+        self.pending_duration = 0
+        self.previous = None
+        self.delay_error = 0.0
+        self.frames_written = 0
+        self.optimize_seconds = 0.0  # time spent on diff rectangles and transparency
+
+    def _open(self, width, height):
+        self.width, self.height = width, height
+        if width % self.cell_w or height % self.cell_h:
+            # Not a whole grid of cells: diff at pixel granularity
+            self.cell_h = self.cell_w = 1
+        self.table = self.palette.table
+
+        self.file = open(self.path, 'wb')
+        self.file.write(b'GIF89a')
+        # Global color table, 8 bits per primary
+        packed = 0x80 | 0x70 | (self.palette.bits - 1)
+        self.file.write(struct.pack('<HHBBB', width, height, packed, 0, 0))
+        self.file.write(self.table)
+        # NETSCAPE2.0 looping extension
+        self.file.write(b'\x21\xFF\x0BNETSCAPE2.0\x03\x01'
+                        + struct.pack('<H', self.loop) + b'\x00')
+
+    def write(self, frame, duration):
+        """Queue a frame shown for ``duration`` milliseconds."""
+        if self.pending is not None:
+            if frame is self.pending or np.array_equal(frame, self.pending):
+                self.pending_duration += duration
+                return
+            self._flush()
+        self.pending = frame
+        self.pending_duration = duration
+
+    def _changed_cells(self, indices):
+        """Boolean (rows, cols) grid of character cells that differ."""
+        rows = self.height // self.cell_h
+        cols = self.width // self.cell_w
+        diff = indices != self.previous
+        return diff.reshape(rows, self.cell_h, cols, self.cell_w).any(axis=(1, 3))
+
+    def _diff_rect(self, indices):
+        """Bounding box of changed cells, opaque and with unchanged pixels transparent."""
+        changed = self._changed_cells(indices)
+        if not changed.any():
+            # Quantization made it identical: redraw one unchanged pixel
+            return 0, 0, indices[:1, :1], None
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        top, bottom = rows[0] * self.cell_h, (rows[-1] + 1) * self.cell_h
+        left, right = cols[0] * self.cell_w, (cols[-1] + 1) * self.cell_w
+
+        # Unchanged pixels (including every pixel of unchanged cells) become
+        # transparent, which turns them into long LZW-friendly runs
+        opaque = indices[top:bottom, left:right]
+        keep = opaque != self.previous[top:bottom, left:right]
+        masked = np.where(keep, opaque, self.palette.transparent).astype(np.uint8)
+        return left, top, opaque, masked
+
+    def _flush(self):
+        frame = self.pending
+        if self.file is None:
+            self._open(frame.shape[1], frame.shape[0])
+        indices = frame if frame.ndim == 2 else self.palette.index(frame)
+
+        # Carry rounding error so the total timing stays exact
+        exact = self.pending_duration / 10.0 + self.delay_error
+        delay = max(1, int(round(exact)))
+        self.delay_error = exact - delay
+
+        start = time.perf_counter()
+        if self.previous is None:
+            left, top, opaque, masked = 0, 0, indices, None
+        else:
+            left, top, opaque, masked = self._diff_rect(indices)
+        self.optimize_seconds += time.perf_counter() - start
+
+        data, transparent = lzw_image_data(opaque, self.table), False
+        if masked is not None:
+            # Keep whichever layout LZW compresses better
+            start = time.perf_counter()
+            masked_data = lzw_image_data(masked, self.table)
+            if len(masked_data) < len(data):
+                data, transparent = masked_data, True
+            self.optimize_seconds += time.perf_counter() - start
+        height, width = opaque.shape
+
+        # Disposal 1 (keep) so later sub-rectangles draw over this frame
+        packed = (1 << 2) | (1 if transparent else 0)
+        self.file.write(b'\x21\xF9\x04' + struct.pack('<BHB', packed, delay,
+                                                       self.palette.transparent) + b'\x00')
+        self.file.write(b'\x2C' + struct.pack('<HHHHB', left, top, width, height, 0))
+        self.file.write(data)
+        self.previous = indices
+        self.frames_written += 1
+
+    def close(self):
+        if self.pending is not None:
+            self._flush()
+            self.pending = None
+        if self.file is not None:
+            self.file.write(b'\x3B')
+            self.file.close()
+            self.file = None
+
+
+class Mp4Writer:
+    """Streams frames to an ffmpeg (libx264) pipe at a constant frame rate."""
+
+    grid_input = False
+    palette_input = False
+    # An ffmpeg failure only loses the MP4, never the other outputs
+    optional = True
+
+    def __init__(self, path, fps):
+        self.path = path
+        # imageio is only needed for MP4 output, so it loads on first use
+        import imageio
+
+        self.writer = imageio.get_writer(path, format='FFMPEG', fps=fps,
+                                         codec='libx264', quality=8,
+                                         pixelformat='yuv420p')
+
+    def write(self, frame, duration):
+        self.writer.append_data(frame)
+
+    def close(self):
+        self.writer.close()
+
+
+class ImageWriter:
+    """Saves the (last) frame as a still image, format from the extension."""
+
+    grid_input = False
+    palette_input = False
+
+    def __init__(self, path):
+        self.path = path
+        self.frame = None
+
+    def write(self, frame, duration):
+        self.frame = frame
+
+    def close(self):
+        if self.frame is not None:
+            Image.fromarray(self.frame).save(self.path)
+            self.frame = None
+
+
+class StripImageWriter:
+    """Saves a still image fed as horizontal RGB strips, top to bottom.
+
+    PNG is streamed: each strip is deflated into IDAT chunks as it
+    arrives, so only one strip is ever in memory. Other formats cannot be
+    written incrementally with Pillow and are assembled on close.
+    """
+
+    grid_input = False
+    palette_input = False
+
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width, self.height = width, height
+        self.strips = None
+        self.file = None
+        if not path.lower().endswith('.png'):
+            self.strips = []
+            return
+
+        self.file = open(path, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # 8-bit RGB, no interlacing
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        self.compressor = zlib.compressobj(6)
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind + data
+                        + struct.pack('>I', zlib.crc32(kind + data)))
+
+    def write(self, strip, duration=0):
+        if self.strips is not None:
+            self.strips.append(strip)
+            return
+        # Every scanline gets filter type 0 (none)
+        rows = np.zeros((strip.shape[0], 1 + self.width * 3), dtype=np.uint8)
+        rows[:, 1:] = strip.reshape(strip.shape[0], -1)
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        if self.strips is not None:
+            if self.strips:
+                Image.fromarray(np.concatenate(self.strips)).save(self.path)
+            self.strips = None
+        elif self.file is not None:
+            self._chunk(b'IDAT', self.compressor.flush())
+            self._chunk(b'IEND', b'')
+            self.file.close()
+            self.file = None
+
+
+class MultiWriter:
+    """Feeds every frame to several writers in a single pass.
+
+    Writers with ``grid_input`` set receive the (indices, colors) character
+    grid instead of rendered pixels. With a ``palette``, frames are
+    palette-indexed, so every pixel writer must have ``palette_input``.
+    ``seconds`` holds the time spent in each writer, keyed by path.
+    A writer with ``optional`` set is dropped, output removed, when it
+    fails; ``failed`` maps its path to the error.
+    """
+
+    def __init__(self, writers, palette=None):
+        self.writers = writers
+        self.palette = palette
+        self.seconds = {writer.path: 0.0 for writer in writers}
+        self.failed = {}
+
+    @property
+    def paths(self):
+        return [writer.path for writer in self.writers]
+
+    @property
+    def needs_pixels(self):
+        """False when every output is text, so frames need not be rendered."""
+        return any(not writer.grid_input for writer in self.writers)
+
+    def to_rgb(self, frame):
+        """RGB pixels of a frame as passed to write()."""
+        if self.palette is None or frame is None:
+            return frame
+        return self.palette.expand(frame)
+
+    def write(self, frame, duration, grid=None):
+        for writer in list(self.writers):
+            start = time.perf_counter()
+            try:
+                writer.write(grid if writer.grid_input else frame, duration)
+            except Exception as e:
+                self._drop(writer, e)
+            self.seconds[writer.path] += time.perf_counter() - start
+
+    def close(self):
+        for writer in list(self.writers):
+            start = time.perf_counter()
+            try:
+                writer.close()
+            except Exception as e:
+                self._drop(writer, e, closed=True)
+            self.seconds[writer.path] += time.perf_counter() - start
+
+    def _drop(self, writer, error, closed=False):
+        """Give up on a failed optional output. Other errors are re-raised."""
+        if not getattr(writer, 'optional', False):
+            raise error
+        self.writers.remove(writer)
+        self.failed[writer.path] = error
+        if not closed:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        if os.path.exists(writer.path):
+            os.remove(writer.path)
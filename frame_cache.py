@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Cache - Frame-level deduplication for video conversion
+Identical (or near-identical) frames are converted once and reused
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+
+# Hard cap on entries; the memory limit (see FrameCache.limit) is usually lower
+MAX_ENTRIES = 256
+SIGNATURE_SIZE = (32, 32)
+
+
+def frame_hash(frame):
+    """Content hash of a decoded frame (shape included)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(frame.shape).encode())
+    digest.update(np.ascontiguousarray(frame).data)
+    return digest.digest()
+
+
+def frame_signature(frame):
+    """Small grayscale thumbnail used for perceptual comparison."""
+    image = Image.fromarray(frame).convert('L').resize(SIGNATURE_SIZE, Image.BOX)
+    return np.asarray(image, dtype=np.float32)
+
+
+class FrameCache:
+    """Maps source frames to already-scheduled conversions.
+
+    Exact duplicates are found by content hash (LRU bounded). With a
+    ``threshold`` > 0, a frame whose thumbnail differs from the previous
+    unique frame by less than that mean fraction (0-1) also reuses it.
+
+    Values hold converted and rendered frames, so once their size is
+    known, limit() bounds the cache by memory as well as by entry count.
+    """
+
+    def __init__(self, threshold=0.0, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entry_bytes = 0
+        self.entries = OrderedDict()
+        self.previous = None
+        self.hits = 0
+        self.misses = 0
+
+    def limit(self, entry_bytes, max_bytes):
+        """Keep at most ``max_bytes`` of values that each hold ``entry_bytes``."""
+        self.entry_bytes = entry_bytes
+        if entry_bytes:
+            self.max_entries = min(self.max_entries, max(1, max_bytes // entry_bytes))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @property
+    def nbytes(self):
+        """Memory held by cached values, the near-duplicate reference included."""
+        return (len(self.entries) + (self.previous is not None)) * self.entry_bytes
+
+    def get_or_submit(self, frame, submit):
+        """Return the cached value for ``frame`` or store ``submit(frame)``."""
+        key = frame_hash(frame)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        signature = None
+        if self.threshold > 0:
+            signature = frame_signature(frame)
+            if self.previous is not None:
+                previous_signature, previous_value = self.previous
+                if previous_signature.shape == signature.shape:
+                    difference = np.abs(signature - previous_signature).mean() / 255
+                    if difference < self.threshold:
+                        self.hits += 1
+                        return previous_value
+
+        value = submit(frame)
+        self.misses += 1
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if signature is not None:
+            self.previous = (signature, value)
+        return value
+
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Store - Memory-mapped, append-only store of a job's frames
+One file holds raw uint8 frames and character grids, so jobs can resume
+"""
+
+import argparse
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+from PIL import Image
+
+from ascii_engine import ENGINE_VERSION, get_flags
+from job_graph import CLIP_SETTINGS
+
+
+STORE_NAME = 'frames.store'
+MAGIC = b'AFST'
+VERSION = 1
+
+# Record kinds
+SOURCE = 0      # decoded source frame (only kept with cleanup off)
+RENDERED = 1    # rendered ASCII frame, RGB (only kept with cleanup off)
+INDICES = 2     # character indices of the grid; commits the frame
+COLORS = 3      # cell colors of the grid (color mode)
+CELLS = 4       # downscaled RGB cells (conversion cache entries)
+KIND_NAMES = {'source': SOURCE, 'rendered': RENDERED, 'indices': INDICES, 'colors': COLORS,
+              'cells': CELLS}
+KINDS = set(KIND_NAMES.values())
+
+# kind, channels (0 = 2-D), frame index, duration ms, height, width
+RECORD = struct.Struct('<BBxxIfII')
+HEADER = struct.Struct('<4sBH')
+
+
+def job_signature(file_path, settings):
+    """Identifies a source file and the settings that shape its grids."""
+    stat = os.stat(file_path)
+    parts = [os.path.abspath(file_path), str(stat.st_size), str(stat.st_mtime_ns),
+             ' '.join(get_flags(settings)), str(settings['dedup_threshold']),
+             ','.join(str(settings[name]) for name in CLIP_SETTINGS),
+             f'engine-{ENGINE_VERSION}']
+    return '|'.join(parts)
+
+
+class FrameStore:
+    """Frames of one job in a single file: raw uint8 arrays plus an index.
+
+    Each record is a fixed header (kind, frame index, duration and shape)
+    followed by the raw array. The index is rebuilt on open by walking the
+    headers, so nothing else has to be written at the end. A record cut
+    short by a crash is dropped. Frames are read back as zero-copy views
+    of a memory map.
+
+    A store written for a different ``job`` (see job_signature) is
+    started over; ``job=None`` opens any existing store.
+    """
+
+    def __init__(self, path, job=''):
+        self.path = path
+        self.job = job.encode() if job is not None else None
+        self.records = {}  # (kind, index) -> (offset, shape, duration)
+        self.lock = threading.Lock()
+        self._map = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        if not self._load():
+            self.job = self.job or b''
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, len(self.job)) + self.job)
+        self.file = open(path, 'r+b')
+        self.file.seek(0, os.SEEK_END)
+        self.size = self.file.tell()
+
+    def _load(self):
+        """Index an existing store of the same job. False to start over."""
+        try:
+            f = open(self.path, 'r+b')
+        except OSError:
+            return False
+        with f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return False
+            magic, version, job_length = HEADER.unpack(header)
+            job = f.read(job_length)
+            if magic != MAGIC or version != VERSION or self.job not in (None, job):
+                return False
+            self.job = job
+
+            position = f.tell()
+            end = f.seek(0, os.SEEK_END)
+            while position + RECORD.size <= end:
+                f.seek(position)
+                kind, channels, index, duration, height, width = RECORD.unpack(
+                    f.read(RECORD.size))
+                shape = (height, width, channels) if channels else (height, width)
+                offset = position + RECORD.size
+                if (kind not in KINDS or not height or not width
+                        or offset + int(np.prod(shape)) > end):
+                    break
+                self.records[(kind, index)] = (offset, shape, duration)
+                position = offset + int(np.prod(shape))
+            if position < end:
+                # Drop the torn record an interrupted job left behind
+                f.truncate(position)
+        return True
+
+    def append(self, kind, index, frame, duration=0.0):
+        """Write a frame record. Thread-safe; flushed before returning."""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        channels = frame.shape[2] if frame.ndim == 3 else 0
+        header = RECORD.pack(kind, channels, index, duration, frame.shape[0], frame.shape[1])
+        with self.lock:
+            self.file.write(header)
+            self.file.write(frame.data)
+            self.file.flush()
+            self.records[(kind, index)] = (self.size + RECORD.size, frame.shape, duration)
+            self.size += RECORD.size + frame.nbytes
+
+    def has(self, kind, index):
+        return (kind, index) in self.records
+
+    def get(self, kind, index):
+        """Read-only view of a frame straight from the memory map."""
+        offset, shape, _ = self.records[(kind, index)]
+        end = offset + int(np.prod(shape))
+        with self.lock:
+            if self._map is None or len(self._map) < end:
+                # The file grew since it was mapped
+                self._map = np.memmap(self.path, dtype=np.uint8, mode='r')
+            data = self._map
+        return data[offset:end].reshape(shape)
+
+    def duration(self, kind, index):
+        return self.records[(kind, index)][2]
+
+    def indices(self, kind):
+        """Sorted frame indices stored for a kind."""
+        return sorted(index for record_kind, index in self.records if record_kind == kind)
+
+    def complete(self, kinds):
+        """Number of leading frames that have a record of every kind."""
+        count = 0
+        while all((kind, count) in self.records for kind in kinds):
+            count += 1
+        return count
+
+    def grid(self, index):
+        """The (indices, colors or None) character grid of a frame."""
+        colors = self.get(COLORS, index) if self.has(COLORS, index) else None
+        return self.get(INDICES, index), colors
+
+    def close(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+        self._map = None
+
+    def remove(self):
+        """Close and delete the store file."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main(argv=None):
+    """Summarize a frame store, optionally exporting frames as PNGs."""
+    parser = argparse.ArgumentParser(
+        prog='ascii-gen-store',
+        description='Inspect a frame store kept with cleanup off.')
+    parser.add_argument('store', help='Path to a frames.store file')
+    parser.add_argument('--export', metavar='DIR', help='Write frames as frame<N>.png here')
+    parser.add_argument('--kind', choices=('source', 'rendered'), default='rendered',
+                        help='Frames to export (default: rendered)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.store):
+        print(f'No frame store at {args.store}', file=sys.stderr)
+        return 1
+    store = FrameStore(args.store, job=None)
+    with store:
+        for name, kind in KIND_NAMES.items():
+            indices = store.indices(kind)
+            if indices:
+                print(f'{name}: {len(indices)} frames {store.get(kind, indices[0]).shape}')
+        if args.export:
+            os.makedirs(args.export, exist_ok=True)
+            kind = KIND_NAMES[args.kind]
+            for index in store.indices(kind):
+                Image.fromarray(store.get(kind, index)).save(
+                    os.path.join(args.export, f'frame{index}.png'))
+            print(f'Exported {len(store.indices(kind))} frames to {args.export}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
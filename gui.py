@@ -5,58 +5,91 @@ Uses tkinter for GUI (free and built into Python)
 """
 
 import time
+
+# --startup-profile times are measured from here
+START = time.perf_counter()
+
+import argparse
 import os
+import platform
 import threading
-import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tkinter import Tk, Label, Entry, Button, Checkbutton, BooleanVar, StringVar, Frame, filedialog, messagebox
 from tkinter.ttk import Progressbar, Style
-from PIL import Image
-try:
-    # moviepy 1.x
-    from moviepy.editor import VideoFileClip
-except ImportError:
-    # moviepy 2.x
-    from moviepy import VideoFileClip
-import imageio
-from termcolor import colored
-import platform
+
+# Only light modules here: the conversion core (NumPy, Pillow) loads in the
+# background once the window is up, and video libraries on first use
+from metrics import create_telemetry
+from scheduler import available_cpus
+from settings import DEFAULT_SETTINGS, SUPPORTED_IMAGE_FORMATS, SUPPORTED_VIDEO_FORMATS, is_image
+
+
+class GuiReporter:
+    """Forwards core pipeline events (see core.Reporter) to the tkinter widgets."""
+
+    STATUS_COLORS = {'info': '#4CAF50', 'error': '#ff6b6b'}
+
+    def __init__(self, app):
+        self.app = app
+        self.bars = {
+            'extract': app.frame_progress,
+            'convert': app.ascii_progress,
+            'encode': app.gif_progress,
+        }
+
+    def status(self, text, level='info'):
+        self.app.update_status(text, self.STATUS_COLORS.get(level, '#888888'))
+
+    def progress(self, stage, value, maximum=100):
+        self.app.update_progress(self.bars[stage], value, maximum)
 
 
 class ASCIIGenerator:
     """Main application class for ASCII art generation from images/videos."""
     
     # Default settings
-    DEFAULT_SETTINGS = {
-        'open_result': True,      # Opens result in native viewer when done
-        'cleanup': True,          # File cleaner
-        'full_char': False,       # Uses more characters (bigger output)
-        'color': False,           # Color mode on/off
-        'full_scale': False,      # False = full res, True = smaller/lower res
-        'export_mp4': False,      # Export as MP4 in addition to GIF
-    }
+    DEFAULT_SETTINGS = DEFAULT_SETTINGS
     
-    SUPPORTED_IMAGE_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
-    SUPPORTED_VIDEO_FORMATS = ('.gif', '.mp4', '.avi', '.mov', '.webm')
+    SUPPORTED_IMAGE_FORMATS = SUPPORTED_IMAGE_FORMATS
+    SUPPORTED_VIDEO_FORMATS = SUPPORTED_VIDEO_FORMATS
 
-    def __init__(self):
+    def __init__(self, startup_profile=False):
         self.system = platform.system()
-        self.max_threads = os.cpu_count() or 4
+        self.max_threads = available_cpus()
         self.processing = False
-        self.setup_directories()
-        self.setup_console()
+        self.core = None
+        self.core_error = None
+        self.core_ready = threading.Event()
+        # Plain tags until the core loads and colors them
+        self.error, self.warn, self.ok, self.info = '[ERROR]', '[WARN]', '[OK]', '[INFO]'
+        self.startup_profile = startup_profile
+        self.timings = {}
         self.setup_gui()
+        # Window first: the core, console and old files are handled behind it
+        threading.Thread(target=self.load_core, daemon=True).start()
+
+    def load_core(self):
+        """Import the conversion core and clean up old files, off the UI thread.
+
+        ``core_ready`` is set even if loading fails, so jobs waiting on it
+        report ``core_error`` instead of hanging.
+        """
+        start = time.perf_counter()
+        try:
+            import core
+            self.timings['core_import'] = time.perf_counter() - start
+            self.core = core
+            self.setup_console()
+            self.setup_directories()
+        except Exception as e:
+            self.core_error = e
+            print(f'{self.error} Could not load the conversion core: {e}')
+        finally:
+            self.timings['core_ready'] = time.perf_counter() - START
+            self.core_ready.set()
         
     def setup_directories(self):
         """Create necessary directories and clean up old files."""
-        for directory in ['frames', 'generated']:
-            os.makedirs(directory, exist_ok=True)
-            # Clean existing files
-            for file in os.listdir(directory):
-                try:
-                    os.remove(os.path.join(directory, file))
-                except OSError:
-                    pass
+        self.core.clear_directory('generated')
         
         # Remove old output files
         for old_file in ['raw.gif', 'output.gif']:
@@ -67,14 +100,13 @@ class ASCIIGenerator:
                     pass
 
     def setup_console(self):
-        """Setup console colors for Windows."""
-        if self.system == 'Windows':
-            os.system('color')
+        """Setup console colors and print the environment."""
+        self.core.setup_console()
         
-        self.error = colored('[ERROR]', 'red')
-        self.warn = colored('[WARN]', 'yellow')
-        self.ok = colored('[OK]', 'cyan')
-        self.info = colored('[INFO]', 'green')
+        self.error = self.core.ERROR
+        self.warn = self.core.WARN
+        self.ok = self.core.OK
+        self.info = self.core.INFO
         
         print(f'{self.info} Running on {self.system}')
         print(f'{self.info} Running with {self.max_threads} threads.')
@@ -104,6 +136,7 @@ class ASCIIGenerator:
         self.color_var = BooleanVar(value=self.DEFAULT_SETTINGS['color'])
         self.full_scale = BooleanVar(value=self.DEFAULT_SETTINGS['full_scale'])
         self.export_mp4 = BooleanVar(value=self.DEFAULT_SETTINGS['export_mp4'])
+        self.export_html = BooleanVar(value=self.DEFAULT_SETTINGS['export_html'])
         
         # Main frame with padding
         main_frame = Frame(self.root, bg='#2b2b2b', padx=20, pady=15)
@@ -135,7 +168,7 @@ class ASCIIGenerator:
             (self.open_result, 'Open Final Result', 
              'Opens the final result in the native viewer when done'),
             (self.cleanup_var, 'Cleanup Files', 
-             'Toggles file cleanup on close. Turn off to keep extracted/generated frames'),
+             'Toggles file cleanup on close. Turn off to keep extracted/generated frames in frames.store'),
             (self.full_char, 'Use More Characters', 
              'Uses all available characters. Higher res, much bigger file'),
             (self.color_var, 'Use Color', 
@@ -144,6 +177,8 @@ class ASCIIGenerator:
              'Makes images smaller, better for sharing if full res not needed'),
             (self.export_mp4, 'Export as MP4', 
              'Also export video as MP4 format (in addition to GIF)'),
+            (self.export_html, 'Export HTML Player',
+             'Also export a small self-contained HTML page that plays the ASCII text'),
         ]
         
         for var, text, tooltip in checkboxes:
@@ -235,32 +270,19 @@ class ASCIIGenerator:
         for bar in [self.frame_progress, self.ascii_progress, self.gif_progress]:
             bar.configure(value=0, maximum=100)
 
-    def get_commands(self):
-        """Build command line arguments for ascii-image-converter."""
-        commands = ['-s', 'generated', '--only-save']
-        
-        if not self.full_scale.get():
-            commands.append('-f')
-            print(f'{self.warn} Using FULLSCALE generation command')
-        
-        if self.full_char.get():
-            commands.append('-c')
-            print(f'{self.warn} Using FULLCHAR generation command')
-        
-        if self.color_var.get():
-            commands.append('-C')
-            print(f'{self.warn} Using COLOR generation command')
-        
-        return ' '.join(commands)
-
-    def delete_directory(self, rel_path):
-        """Delete a directory and its contents."""
-        try:
-            for item in os.listdir(rel_path):
-                os.remove(os.path.join(rel_path, item))
-            os.rmdir(rel_path)
-        except OSError as e:
-            print(f'{self.error} Failed to delete {rel_path}: {e}')
+    def get_settings(self):
+        """Snapshot the current GUI options as a settings dict."""
+        settings = dict(self.DEFAULT_SETTINGS)
+        settings.update({
+            'open_result': self.open_result.get(),
+            'cleanup': self.cleanup_var.get(),
+            'full_char': self.full_char.get(),
+            'color': self.color_var.get(),
+            'full_scale': self.full_scale.get(),
+            'export_mp4': self.export_mp4.get(),
+            'export_html': self.export_html.get(),
+        })
+        return settings
 
     def start_processing(self):
         """Start the processing in a background thread."""
@@ -288,21 +310,22 @@ class ASCIIGenerator:
 
     def process_file(self, file_path):
         """Main processing function - runs in background thread."""
+        self.core_ready.wait()
         try:
-            file_lower = file_path.lower()
-            
-            # Check if it's an image or video
-            if any(file_lower.endswith(ext) for ext in self.SUPPORTED_IMAGE_FORMATS):
-                self.process_image(file_path)
-            elif any(file_lower.endswith(ext) for ext in self.SUPPORTED_VIDEO_FORMATS):
-                self.process_video(file_path)
-            else:
-                self.update_status('Unsupported file format!', '#ff6b6b')
-                messagebox.showerror('Error', 'Unsupported file format!')
-                return
-                
+            if self.core_error is not None:
+                raise Exception(f'Could not load the conversion core: {self.core_error}')
+            # Metrics/profiling are opt-in through ASCII_GEN_METRICS / ASCII_GEN_PROFILE
+            self.core.convert_file(file_path, settings=self.get_settings(),
+                                   reporter=GuiReporter(self), telemetry=create_telemetry())
+            if is_image(file_path) and 'first_image' not in self.timings:
+                self.timings['first_image'] = time.perf_counter() - START
+                if self.startup_profile:
+                    self.report_startup()
         except Exception as e:
             print(f'{self.error} {str(e)}')
+            if self.startup_profile == 'exit':
+                self.root.after(0, self.root.destroy)
+                return
             self.update_status(f'Error: {str(e)}', '#ff6b6b')
             messagebox.showerror('Error', f'An error occurred: {str(e)}')
         finally:
@@ -310,242 +333,18 @@ class ASCIIGenerator:
             self.root.after(0, lambda: self.create_btn.configure(
                 state='normal', bg='#2196F3'))
 
-    def process_image(self, file_path):
-        """Process a single image file."""
-        self.update_status('Processing image...', '#4CAF50')
-        commands = self.get_commands()
-        
-        # Run ascii-image-converter
-        if self.system == 'Windows':
-            os.system(f'start /W /B ascii-image-converter.exe "{file_path}" {commands}')
-        else:
-            os.system(f'ascii-image-converter "{file_path}" {commands}')
-        
-        self.update_progress(self.frame_progress, 100)
-        self.update_progress(self.ascii_progress, 100)
-        self.update_progress(self.gif_progress, 100)
-        
-        # Check output
-        png_files = os.listdir('generated')
-        if len(png_files) >= 1:
-            new_file = os.path.join('generated', png_files[0])
-            output_file = os.path.join('generated', 'output.png')
-            if new_file != output_file:
-                os.rename(new_file, output_file)
-            print(f'{self.info} Saved in generated dir as "output.png"')
-            
-            if self.open_result.get():
-                print(f'{self.info} Launching viewer.')
-                if self.system == 'Windows':
-                    os.startfile(output_file)
-                else:
-                    os.system(f'xdg-open "{output_file}"')
-            
-            self.update_status('Image conversion complete!', '#4CAF50')
-        else:
-            self.update_status('Image conversion failed!', '#ff6b6b')
-            print(f'{self.error} Image conversion failed.')
-
-    def process_video(self, file_path):
-        """Process a video/GIF file."""
-        self.update_status('Extracting frames...', '#4CAF50')
-        
-        # Read frames
-        try:
-            frames = imageio.mimread(file_path, memtest=False)
-        except Exception as e:
-            raise Exception(f'Failed to read video file: {e}')
-        
-        total_frames = len(frames)
-        print(f'{self.info} Extracting {total_frames} frames.')
-        
-        # Extract frames with threading
-        self.extract_frames(frames, total_frames)
-        
-        # Process frames to ASCII
-        self.update_status('Generating ASCII art...', '#4CAF50')
-        frame_files = os.listdir('frames')
-        self.convert_frames_to_ascii(frame_files)
-        
-        # Create GIF
-        self.update_status('Creating GIF...', '#4CAF50')
-        self.create_gif(file_path)
-        
-        # Cleanup
-        if self.cleanup_var.get():
-            print(f'{self.info} Cleaning files.')
-            self.delete_directory('generated')
-            self.delete_directory('frames')
-            print(f'{self.ok} Files deleted.')
-        
-        self.update_status('Generation complete!', '#4CAF50')
-        print(f'{self.ok} Generation complete!')
-
-    def extract_frames(self, frames, total_frames):
-        """Extract frames from video with multithreading."""
-        def save_frame(frame, index):
-            try:
-                image = Image.fromarray(frame)
-                image.save(f'frames/frame{index}.png', optimize=True, quality=100)
-            except Exception as e:
-                print(f'{self.error} Frame {index} failed: {e}')
-        
-        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-            futures = []
-            for i, frame in enumerate(frames):
-                future = executor.submit(save_frame, frame, i)
-                futures.append(future)
-            
-            completed = 0
-            for future in as_completed(futures):
-                completed += 1
-                self.update_progress(self.frame_progress, completed, total_frames)
-        
-        print(f'{self.ok} Extracted {len(os.listdir("frames"))} frames.')
-
-    def convert_frames_to_ascii(self, frame_files):
-        """Convert extracted frames to ASCII art."""
-        commands = self.get_commands()
-        total_files = len(frame_files)
-        processed = [0]  # Use list for mutable counter in nested function
-        lock = threading.Lock()
-        
-        def process_frame(item):
-            if self.system == 'Windows':
-                os.system(f'start /W /B ascii-image-converter.exe "frames/{item}" {commands}')
-            else:
-                os.system(f'ascii-image-converter "frames/{item}" {commands}')
-            
-            with lock:
-                processed[0] += 1
-                self.update_progress(self.ascii_progress, processed[0], total_files)
-        
-        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-            futures = [executor.submit(process_frame, item) for item in frame_files]
-            
-            # Wait for all to complete
-            for future in as_completed(futures):
-                pass
-        
-        print(f'{self.ok} All frames processed.')
-
-    def get_video_fps(self, file_path):
-        """Get the FPS of a video file."""
-        try:
-            if file_path.lower().endswith('.gif'):
-                total_frames = 0
-                total_duration = 0
-                
-                with Image.open(file_path) as img:
-                    while True:
-                        try:
-                            img.seek(img.tell() + 1)
-                            total_frames += 1
-                            total_duration += img.info.get('duration', 100) / 1000.0
-                        except EOFError:
-                            break
-                
-                return total_frames / total_duration if total_duration > 0 else 10
-            else:
-                video_clip = VideoFileClip(file_path)
-                fps = video_clip.fps
-                video_clip.close()
-                return fps
-        except Exception as e:
-            print(f'{self.warn} Could not determine FPS: {e}. Using default 10 FPS.')
-            return 10
+    def report_startup(self):
+        """Print (and record) time-to-window and time-to-first-image."""
+        self.core_ready.wait()
+        timings = {name: round(seconds, 3) for name, seconds in self.timings.items()}
+        print(f'{self.info} Startup profile: ' + ', '.join(
+            f'{name.replace("_", " ")} {seconds:.3f}s' for name, seconds in timings.items()))
+        create_telemetry().event('startup', **timings)
+        if self.startup_profile == 'exit':
+            self.root.after(0, self.root.destroy)
 
-    def create_gif(self, original_file_path):
-        """Create the output GIF from processed frames."""
-        print(f'{self.info} Starting frame collection')
-        self.update_progress(self.gif_progress, 0, 4)
-        
-        png_files = os.listdir('generated')
-        frames_data = {}
-        
-        for item in png_files:
-            if item.endswith('.png'):
-                frame_number = re.sub('[^0-9]', '', item)
-                if frame_number:
-                    frames_data[int(frame_number)] = item
-        
-        # Sort frames by number
-        sorted_files = [frames_data[i] for i in sorted(frames_data.keys())]
-        self.update_progress(self.gif_progress, 1, 4)
-        
-        # Load frames
-        frames = [imageio.imread(f'generated/{file}') for file in sorted_files]
-        
-        # Calculate timing
-        fps = self.get_video_fps(original_file_path)
-        frame_duration = 1.0 / fps if fps > 0 else 0.1
-        gif_frame_duration = int(frame_duration * 1000)
-        
-        print(f'{self.ok} Frame collection complete. FPS: {fps:.2f}')
-        print(f'{self.info} Saving GIF. This may take a while...')
-        self.update_progress(self.gif_progress, 2, 4)
-        
-        # Create durations list
-        durations = [gif_frame_duration] * len(frames)
-        
-        # Save raw GIF
-        imageio.mimsave('raw.gif', frames, duration=durations, loop=0)
-        print(f'{self.ok} GIF created.')
-        self.update_progress(self.gif_progress, 3, 4)
-        
-        # Optimize with gifsicle
-        print(f'{self.info} Optimizing GIF.')
-        if self.system == 'Windows':
-            os.system('gifsicle.exe raw.gif --colors 256 -o output.gif')
-        else:
-            os.system('gifsicle raw.gif --colors 256 -o output.gif')
-        
-        # Cleanup raw file
-        if os.path.exists('raw.gif'):
-            os.remove('raw.gif')
-        
-        print(f'{self.ok} GIF optimized and saved as output.gif')
-        self.update_progress(self.gif_progress, 4, 4)
-        
-        # Create MP4 if requested
-        if self.export_mp4.get():
-            print(f'{self.info} Creating MP4 version...')
-            try:
-                # Use imageio to create MP4
-                imageio.mimsave('output.mp4', frames, fps=fps, codec='libx264', quality=8)
-                print(f'{self.ok} MP4 created and saved as output.mp4')
-            except Exception as e:
-                print(f'{self.warn} MP4 creation failed: {e}')
-                print(f'{self.info} Trying alternative method...')
-                try:
-                    # Alternative: use ffmpeg directly via imageio-ffmpeg
-                    imageio.mimsave('output.mp4', frames, fps=fps, 
-                                  format='FFMPEG', codec='libx264', 
-                                  ffmpeg_params=['-pix_fmt', 'yuv420p'])
-                    print(f'{self.ok} MP4 created successfully')
-                except Exception as e2:
-                    print(f'{self.error} MP4 creation failed: {e2}')
-        
-        # Open result if requested
-        if self.open_result.get():
-            print(f'{self.info} Launching GIF viewer.')
-            if self.system == 'Windows':
-                os.startfile('output.gif')
-            else:
-                os.system('xdg-open "output.gif"')
-            print(f'{self.ok} Launched.')
-            
-            # Also open MP4 if it was created
-            if self.export_mp4.get() and os.path.exists('output.mp4'):
-                print(f'{self.info} Launching MP4 viewer.')
-                if self.system == 'Windows':
-                    os.startfile('output.mp4')
-                else:
-                    os.system('xdg-open "output.mp4"')
-                print(f'{self.ok} Launched.')
-
-    def run(self):
-        """Start the application."""
+    def run(self, image_path=None):
+        """Start the application, converting ``image_path`` once the window is up."""
         # Center window on screen
         self.root.update_idletasks()
         width = self.root.winfo_width()
@@ -553,14 +352,32 @@ class ASCIIGenerator:
         x = (self.root.winfo_screenwidth() // 2) - (width // 2)
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f'+{x}+{y}')
+
+        # Draw the window now so the time to a visible window can be measured
+        self.root.update()
+        self.timings['window'] = time.perf_counter() - START
+        if self.startup_profile is True:
+            threading.Thread(target=self.report_startup, daemon=True).start()
+        if image_path:
+            self.file_path.set(image_path)
+            self.open_result.set(False)
+            self.root.after(0, self.start_processing)
         
         self.root.mainloop()
 
 
-def main():
+def main(argv=None):
     """Main entry point."""
-    app = ASCIIGenerator()
-    app.run()
+    parser = argparse.ArgumentParser(
+        prog='ascii-gen-gui', description='Convert images and videos to ASCII art.')
+    parser.add_argument('--startup-profile', nargs='?', const='', metavar='IMAGE',
+                        help='Report time to window and to the first image result. '
+                             'With an image, convert it right away and exit.')
+    args = parser.parse_args(argv)
+
+    profile = args.startup_profile
+    app = ASCIIGenerator(startup_profile='exit' if profile else profile is not None)
+    app.run(profile or None)
 
 
 if __name__ == '__main__':
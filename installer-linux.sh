@@ -1,6 +1,3 @@
-echo 'deb [trusted=yes] https://apt.fury.io/ascii-image-converter/ /' | sudo tee /etc/apt/sources.list.d/ascii-image-converter.list
 sudo apt update
-sudo apt install -y ascii-image-converter
-sudo apt install -y gifsicle
 sudo apt install -y python3-tk
 python3 -m pip install -r requirements.txt
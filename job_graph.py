@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Job Graph - Per-job dependency graph of the conversion stages
+Each stage's cache key chains its parent's key with the settings it reads
+"""
+
+import hashlib
+
+from ascii_engine import ENGINE_VERSION
+
+
+# Settings that change which frames are converted
+CLIP_SETTINGS = ('start', 'end', 'max_duration', 'stride', 'target_fps')
+
+# Stages upstream first, with the settings each one reads first. A stage's
+# output depends on its own settings and everything upstream, so changing a
+# setting invalidates the stage reading it and every stage after it.
+STAGES = (
+    ('decode', CLIP_SETTINGS),
+    # Grid size; near-duplicate frames share the cells of an earlier frame
+    # Tiled images may be decoded at a reduced scale
+    ('downscale', ('full_scale', 'columns', 'rows', 'width', 'dedup_threshold', 'tiled')),
+    # Luminance -> charset index, and whether cell colors are kept
+    ('grid', ('full_char', 'color')),
+    # Glyph atlas and tint follow from the grid stage settings
+    ('render', ()),
+    # Every output format is cached as its own artifact of this stage
+    ('encode', ()),
+)
+STAGE_NAMES = tuple(name for name, _ in STAGES)
+
+
+def stage_keys(source_hash, settings):
+    """Cache key of every stage of a job, by stage name.
+
+    Keys are content addressed: two jobs on the same source share the keys
+    of every stage upstream of the first setting they disagree on. So a
+    charset change keeps the decode and downscale keys and only gets new
+    grid, render and encode keys.
+    """
+    keys = {}
+    key = f'{source_hash}|engine-{ENGINE_VERSION}'
+    for stage, names in STAGES:
+        values = ','.join(f'{name}={settings[name]}' for name in names)
+        key = hashlib.sha1(f'{key}|{stage}|{values}'.encode()).hexdigest()
+        keys[stage] = key
+    return keys
+
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Live - Real-time ANSI streaming of videos to the terminal
+Frames are converted as they are decoded and paced to the source fps
+"""
+
+import os
+import shutil
+import sys
+import time
+
+from PIL import Image
+
+from ascii_engine import ASCIIEngine
+from core import INFO, OK, WARN, resolve_settings
+from metrics import Telemetry
+from probe import probe
+from text_formats import RESET, grid_to_lines
+from video_reader import Clip, FrameReader
+
+
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+CLEAR_SCREEN = '\x1b[2J'
+
+
+def fit_columns(engine, width, height, terminal_size):
+    """Largest column count <= engine.columns whose grid fits the terminal."""
+    if engine.rows:
+        # An explicit grid size is the user's call
+        return engine.columns
+    max_columns, max_rows = terminal_size
+    columns = min(engine.columns, max_columns)
+    while columns > 1:
+        engine.columns = columns
+        if engine.grid_size(width, height)[1] <= max_rows:
+            break
+        columns -= 1
+    engine.columns = max(1, columns)
+    return engine.columns
+
+
+class TerminalStream:
+    """Draws ASCII frames in place, rewriting only rows that changed."""
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.previous = []
+
+    def start(self):
+        self.out.write(HIDE_CURSOR + CLEAR_SCREEN)
+
+    def draw(self, lines):
+        parts = []
+        for row, line in enumerate(lines):
+            if row >= len(self.previous) or self.previous[row] != line:
+                parts.append(f'\x1b[{row + 1};1H{line}')
+        self.previous = lines
+        if parts:
+            self.out.write(''.join(parts))
+            self.out.flush()
+
+    def finish(self):
+        # Park the cursor below the last frame
+        self.out.write(f'{RESET}\x1b[{len(self.previous) + 1};1H{SHOW_CURSOR}')
+        self.out.flush()
+
+
+def print_image(file_path, settings=None, out=None):
+    """Write an image once as ANSI art."""
+    settings = resolve_settings(settings)
+    out = out or sys.stdout
+    engine = ASCIIEngine(settings)
+    with Image.open(file_path) as image:
+        image = image.convert('RGB')
+    if out.isatty():
+        columns, lines = shutil.get_terminal_size()
+        fit_columns(engine, image.width, image.height, (columns, lines - 1))
+    out.write('\n'.join(grid_to_lines(*engine.to_grid(image), engine.charset)) + '\n')
+    out.flush()
+
+
+def stream_video(file_path, settings=None, out=None, telemetry=None):
+    """Play a video/GIF as ANSI art in real time. Returns playback stats.
+
+    Frames are shown at their probed timestamps. When playback falls more
+    than one frame behind, a frame is dropped (decoded but never converted)
+    only if a newer one is already decoded. Otherwise it is shown and the
+    clock restarts from it, so decoding slower than real time plays at
+    the achievable rate instead of dropping everything.
+    """
+    settings = resolve_settings(settings)
+    telemetry = telemetry or Telemetry()
+    out = out or sys.stdout
+
+    info = probe(file_path)
+    engine = ASCIIEngine(settings)
+    if out.isatty():
+        columns, lines = shutil.get_terminal_size()
+        fit_columns(engine, info.width, info.height, (columns, lines - 1))
+    # Decode straight to the grid size and only the frames we may show
+    clip = Clip.from_settings(settings, engine.fix_grid(info.width, info.height))
+    source_fps = info.fps
+    info = clip.plan(info, gif=file_path.lower().endswith('.gif'))
+
+    stream = TerminalStream(out)
+    shown = dropped = 0
+    media_time = 0.0
+    start = None
+    stream.start()
+    try:
+        with FrameReader(file_path, settings['max_memory_mb'], info.frame_count,
+                         clip, source_fps) as reader:
+            for index, frame in enumerate(reader):
+                duration = info.frame_duration(index) / 1000.0
+                now = time.perf_counter()
+                if start is None:
+                    start = now
+                due = start + media_time
+                media_time += duration
+
+                # Behind by more than a frame: skip to a newer frame if one is ready
+                late = now > due + duration and shown
+                if late and reader.ready:
+                    dropped += 1
+                    continue
+
+                lines = grid_to_lines(*engine.to_grid(frame), engine.charset)
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif late:
+                    # Nothing newer to skip to: play on from this frame
+                    start -= delay
+                stream.draw(lines)
+                shown += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.finish()
+
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    stats = {
+        'target_fps': round(info.fps, 2),
+        'achieved_fps': round(shown / elapsed, 2) if elapsed else 0.0,
+        'shown': shown,
+        'dropped': dropped,
+        'seconds': round(elapsed, 3),
+        'columns': engine.columns,
+        'color': engine.color,
+    }
+    telemetry.event('stream', **stats)
+    return stats
+
+
+def report(stats, file=None):
+    """Print achieved vs target fps after playback."""
+    file = file or sys.stderr
+    level = WARN if stats['dropped'] else OK
+    print(f'{level} {stats["achieved_fps"]:.2f}/{stats["target_fps"]:.2f} fps, '
+          f'{stats["shown"]} shown, {stats["dropped"]} dropped '
+          f'in {stats["seconds"]:.1f}s.', file=file)
+    if os.environ.get('COLORTERM') not in ('truecolor', '24bit') and stats.get('color'):
+        print(f'{INFO} COLORTERM does not advertise truecolor; colors may be approximated.',
+              file=file)
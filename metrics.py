@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics - Structured per-job telemetry for the conversion pipeline
+Stage timings, queue depths, worker utilization, cache hits and bytes written
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+TRACEMALLOC_TOP = 10
+
+# Environment fallbacks so the GUI can be instrumented without new options
+METRICS_ENV = 'ASCII_GEN_METRICS'
+PROFILE_ENV = 'ASCII_GEN_PROFILE'
+PROFILE_DIR_ENV = 'ASCII_GEN_PROFILE_DIR'
+
+# Profiling is process-wide while jobs may run on several threads at once:
+# each running cprofile job collects the profilers of threads started since
+# it began, and tracemalloc runs while any job traces memory
+_profile_lock = threading.Lock()
+_profiled_jobs = []
+_traced_jobs = 0
+_tracemalloc_owned = False
+
+
+def _profile_thread(frame, event, arg):
+    """threading.setprofile hook: give a new thread its own cProfile profiler."""
+    sys.setprofile(None)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ profiles every thread from the job's own profiler
+        return
+    with _profile_lock:
+        for profilers in _profiled_jobs:
+            profilers.append(profiler)
+
+
+def _start_cprofile():
+    """Profile the calling thread and every thread started from now on."""
+    profilers = []
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        profilers.append(profiler)
+    except ValueError:
+        pass  # Python 3.12+: another job's profiler already covers all threads
+    with _profile_lock:
+        if not _profiled_jobs:
+            threading.setprofile(_profile_thread)
+        _profiled_jobs.append(profilers)
+    return profilers
+
+
+def _stop_cprofile(profilers):
+    """Stop profiling a job. Returns its merged pstats.Stats, or None."""
+    if profilers:
+        profilers[0].disable()
+    with _profile_lock:
+        _profiled_jobs.remove(profilers)
+        if not _profiled_jobs:
+            threading.setprofile(None)
+    if not profilers:
+        return None
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    return stats
+
+
+def _start_tracemalloc():
+    """Trace allocations until the last job tracing memory stops."""
+    global _traced_jobs, _tracemalloc_owned
+    with _profile_lock:
+        if not _traced_jobs:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+        _traced_jobs += 1
+
+
+def _stop_tracemalloc():
+    """Memory report of a job: shared with any job traced at the same time."""
+    global _traced_jobs
+    with _profile_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics('lineno')[:TRACEMALLOC_TOP]
+        concurrent = _traced_jobs - 1
+        _traced_jobs -= 1
+        if not _traced_jobs and _tracemalloc_owned:
+            tracemalloc.stop()
+    return {
+        'current_mb': round(current / (1024 * 1024), 2),
+        'peak_mb': round(peak / (1024 * 1024), 2),
+        # Traced memory is process-wide: numbers include these other jobs
+        'concurrent_jobs': concurrent,
+        'top': [{'site': str(stat.traceback), 'kb': round(stat.size / 1024, 1),
+                 'count': stat.count} for stat in stats],
+    }
+
+
+class JsonLinesSink:
+    """Appends one JSON object per event to a file.
+
+    Each event is written with a single append, so several processes of a
+    batch can share one file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str) + '\n'
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class Telemetry:
+    """Emits structured events for conversion jobs to any number of sinks.
+
+    A sink is any callable taking an event dict. With no sinks and no
+    profile mode, every call is a cheap no-op.
+    """
+
+    def __init__(self, sinks=None, profile=None, profile_dir='profiles'):
+        if profile is not None and profile not in PROFILE_MODES:
+            raise ValueError(f'Unknown profile mode: {profile}')
+        self.sinks = list(sinks or [])
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.job_id = None
+        self.file_path = None
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def event(self, name, **fields):
+        """Send an event, tagged with the current job, to every sink."""
+        if not self.sinks:
+            return
+        event = {'ts': round(time.time(), 3), 'event': name,
+                 'job': self.job_id, 'file': self.file_path}
+        event.update(fields)
+        for sink in self.sinks:
+            sink(event)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Time a block as a pipeline stage. Yields a dict for extra fields."""
+        extra = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            self.event('stage', stage=name,
+                       seconds=round(time.perf_counter() - start, 4), **extra)
+
+    @contextmanager
+    def job(self, file_path):
+        """Wrap one conversion: job start/end events plus optional profiling."""
+        self.job_id = uuid.uuid4().hex[:12]
+        self.file_path = file_path
+        self.event('job_start')
+
+        profilers = None
+        if self.profile == 'cprofile':
+            profilers = _start_cprofile()
+        elif self.profile == 'tracemalloc':
+            _start_tracemalloc()
+
+        result = {'status': 'ok'}
+        start = time.perf_counter()
+        try:
+            yield result
+        except Exception as e:
+            result.update(status='error', error=str(e))
+            raise
+        finally:
+            result['seconds'] = round(time.perf_counter() - start, 4)
+            if profilers is not None:
+                stats = _stop_cprofile(profilers)
+                if stats is not None:
+                    result['profile'] = self._dump_profile(stats)
+            elif self.profile == 'tracemalloc':
+                result['memory'] = _stop_tracemalloc()
+            outputs = result.get('outputs') or []
+            result['bytes_written'] = sum(path_bytes(path) for path in outputs)
+            self.event('job_end', **result)
+            self.job_id = self.file_path = None
+
+    def _dump_profile(self, stats):
+        """Save cProfile stats for the current job. Returns the file path."""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(self.file_path))[0]
+        path = os.path.join(self.profile_dir, f'{stem}-{self.job_id}.prof')
+        stats.dump_stats(path)
+        return path
+
+
+def path_bytes(path):
+    """Size of an output file, or of every file in an output directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def create_telemetry(metrics_file=None, profile=None, profile_dir=None):
+    """Build a Telemetry from options, falling back to the environment."""
+    metrics_file = metrics_file or os.environ.get(METRICS_ENV)
+    profile = profile or os.environ.get(PROFILE_ENV) or None
+    profile_dir = profile_dir or os.environ.get(PROFILE_DIR_ENV) or 'profiles'
+    sinks = [JsonLinesSink(metrics_file)] if metrics_file else []
+    return Telemetry(sinks, profile, profile_dir)
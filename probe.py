@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Probe - Fast media metadata without decoding frames
+Reads frame count, per-frame durations, fps and size from GIF and container headers
+"""
+
+import struct
+
+
+DEFAULT_FPS = 10
+# Browsers show GIF frames with a 0 delay for 100 ms, so we do too
+ZERO_DELAY_MS = 100
+
+
+class MediaInfo:
+    """Metadata of an image or video, shared by every pipeline stage."""
+
+    def __init__(self, width, height, fps, frame_count=None, durations=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = frame_count
+        self.durations = durations  # per-frame milliseconds (GIF only)
+
+    def frame_duration(self, index):
+        """Display time of a frame in milliseconds."""
+        if self.durations and index < len(self.durations):
+            return self.durations[index]
+        return 1000.0 / self.fps if self.fps > 0 else 1000.0 / DEFAULT_FPS
+
+    def __repr__(self):
+        return (f'MediaInfo({self.width}x{self.height}, {self.fps:.2f} fps, '
+                f'{self.frame_count} frames)')
+
+
+def probe(file_path):
+    """Probe a media file without decoding its frames."""
+    if file_path.lower().endswith('.gif'):
+        return probe_gif(file_path)
+    return probe_video(file_path)
+
+
+def _skip_sub_blocks(f):
+    """Skip a chain of GIF data sub-blocks."""
+    while True:
+        size = f.read(1)
+        if not size or size[0] == 0:
+            return
+        f.seek(size[0], 1)
+
+
+def probe_gif(file_path):
+    """Walk the GIF block structure, skipping LZW data without decoding it."""
+    durations = []
+    delay = None
+    with open(file_path, 'rb') as f:
+        header = f.read(13)
+        if len(header) < 13 or header[:3] != b'GIF':
+            raise Exception(f'Not a GIF file: {file_path}')
+        width, height, flags = struct.unpack('<HHB', header[6:11])
+        if flags & 0x80:
+            f.seek(3 << ((flags & 0x07) + 1), 1)
+
+        while True:
+            block = f.read(1)
+            if not block or block == b'\x3B':
+                break
+            if block == b'\x21':
+                label = f.read(1)
+                if label == b'\xF9':
+                    # Graphic control extension: delay in centiseconds
+                    data = f.read(f.read(1)[0])
+                    delay = struct.unpack('<H', data[1:3])[0] * 10
+                _skip_sub_blocks(f)
+            elif block == b'\x2C':
+                descriptor = f.read(9)
+                if descriptor[8] & 0x80:
+                    f.seek(3 << ((descriptor[8] & 0x07) + 1), 1)
+                f.seek(1, 1)  # LZW minimum code size
+                _skip_sub_blocks(f)
+                durations.append(delay or ZERO_DELAY_MS)
+                delay = None
+            else:
+                break  # Trailing garbage: keep what we have
+
+    total = sum(durations)
+    fps = len(durations) * 1000.0 / total if total else DEFAULT_FPS
+    return MediaInfo(width, height, fps, len(durations), durations)
+
+
+def probe_video(file_path):
+    """Read fps, size and duration from the container header via ffmpeg."""
+    # Only videos need ffmpeg, so images and GIFs never load it
+    import imageio_ffmpeg
+
+    frames = imageio_ffmpeg.read_frames(file_path)
+    try:
+        meta = next(frames)
+    finally:
+        frames.close()
+
+    width, height = meta['size']
+    fps = meta.get('fps') or DEFAULT_FPS
+    duration = meta.get('duration')
+    frame_count = int(round(duration * fps)) if duration else None
+    return MediaInfo(width, height, fps, frame_count)
+
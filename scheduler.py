@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduler - CPU/memory-aware sizing of the pipeline stages
+Honours affinity masks and cgroup quotas instead of trusting os.cpu_count()
+"""
+
+import math
+import os
+
+
+# Re-size the convert stage after this many frames
+ADAPT_INTERVAL = 8
+# Never let in-flight frames use more than this share of the memory budget
+IN_FLIGHT_MEMORY_SHARE = 0.5
+# Part of the in-flight share the duplicate frame cache may hold
+DEDUP_MEMORY_SHARE = 0.25
+# Keep this share of the available memory free for everything else
+MEMORY_HEADROOM = 0.5
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit():
+    """CPU quota of the current cgroup in cores (None when unlimited)."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    value = _read('/sys/fs/cgroup/cpu.max')
+    if value:
+        quota, _, period = value.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+    # cgroup v1
+    quota = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus():
+    """Cores this process can actually use (affinity mask and cgroup quota)."""
+    if hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+    quota = cgroup_cpu_limit()
+    if quota:
+        # A fractional quota still keeps the last core partly busy
+        count = min(count, max(1, math.ceil(quota)))
+    return max(1, count)
+
+
+def available_memory_mb():
+    """Memory we may use in MB: cgroup limit and MemAvailable (None if unknown)."""
+    limits = []
+    for path in ('/sys/fs/cgroup/memory.max',
+                 '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = _read(path)
+        if value and value.isdigit() and int(value) < 1 << 60:
+            usage = _read(path.replace('.max', '.current').replace('limit_in', 'usage_in'))
+            used = int(usage) if usage and usage.isdigit() else 0
+            limits.append((int(value) - used) / (1024 * 1024))
+    meminfo = _read('/proc/meminfo')
+    if meminfo:
+        for line in meminfo.splitlines():
+            if line.startswith('MemAvailable:'):
+                limits.append(int(line.split()[1]) / 1024)
+    return int(min(limits)) if limits else None
+
+
+def memory_budget_mb(requested_mb):
+    """Cap a requested memory budget to a safe share of what is available."""
+    available = available_memory_mb()
+    if available is None:
+        return requested_mb
+    return max(16, min(requested_mb, int(available * MEMORY_HEADROOM)))
+
+
+class StageScheduler:
+    """Sizes the convert stage to keep the whole pipeline busy.
+
+    Decode runs on one background thread and encode on the consuming
+    thread, since both are sequential. Conversion runs on a thread pool,
+    because NumPy and Pillow release the GIL and threads avoid pickling
+    frames to other processes. The number of frames converted concurrently
+    follows the measured per-frame cost of each stage. It is enough
+    workers for conversion to keep up with the slower of decode and
+    encode, capped by the CPUs and by the memory budget. Extra workers
+    would only compete with the decoder and encoder for the same cores.
+    """
+
+    def __init__(self, max_workers, memory_budget_mb):
+        self.max_workers = max(1, max_workers)
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.workers = self.max_workers
+        self.frame_bytes = 0
+        self.cached_bytes = 0
+
+    def observe_frame(self, nbytes):
+        """Record the memory one in-flight frame holds (source + rendered)."""
+        self.frame_bytes = max(self.frame_bytes, nbytes)
+
+    def observe_cache(self, nbytes):
+        """Record the memory held by reusable converted frames (see FrameCache)."""
+        self.cached_bytes = nbytes
+
+    def adapt(self, convert, decode, encode):
+        """Re-size from measured per-frame stage seconds. Returns the worker count."""
+        bottleneck = max(decode, encode, 1e-6)
+        # Converting a frame takes `convert`; a new one is needed every `bottleneck`
+        self.workers = max(1, min(self.max_workers, math.ceil(convert / bottleneck)))
+        return self.workers
+
+    @property
+    def window(self):
+        """Frames allowed in flight: two per worker, within the memory budget.
+
+        Frames held by the duplicate cache count against the same budget.
+        """
+        window = self.workers * 2
+        if self.frame_bytes:
+            free = self.memory_budget * IN_FLIGHT_MEMORY_SHARE - self.cached_bytes
+            window = min(window, max(1, int(free // self.frame_bytes)))
+        return window
@@ -0,0 +1,626 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII Service - Long-running local conversion service
+Warm workers take jobs from a bounded priority queue over HTTP or a Unix socket
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import queue
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlsplit
+
+import core
+from core import ERROR, OK, INFO
+from ascii_engine import CHARSET_FULL, CHARSET_SIMPLE, get_atlas, get_level_atlas
+from batch import plan_workers
+from cli import OUTPUT_FORMATS, add_settings_arguments, output_path_for, settings_from_args
+from encoders import glyph_palette
+from metrics import create_telemetry
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_WORKSPACE = os.path.join(tempfile.gettempdir(), 'ascii-gen-service')
+# Finished jobs whose artifacts are kept before the oldest are deleted
+MAX_FINISHED_JOBS = 64
+# Lower numbers run first
+DEFAULT_PRIORITY = 10
+CHUNK_SIZE = 1024 * 1024
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# Settings a client may choose per job. Everything else stays the
+# server's: cache location and size, cleanup, and tiled decoding (which
+# lifts Pillow's decompression bomb limit).
+JOB_SETTINGS = (
+    'full_char', 'color', 'full_scale', 'export_mp4', 'export_txt', 'export_ans',
+    'export_stream', 'export_html', 'jobs', 'max_memory_mb', 'dedup_threshold', 'cache',
+    'start', 'end', 'max_duration', 'stride', 'target_fps', 'columns', 'rows', 'width',
+)
+# (lowest, highest) accepted value of numeric per-job settings; others only
+# have to be finite and >= 0. Grid and output sizes are capped so a single
+# job cannot render frames that exhaust the server's memory or disk.
+SETTING_RANGES = {
+    'stride': (1, None),
+    'dedup_threshold': (0, 1),
+    'columns': (0, 640),
+    'rows': (0, 480),
+    'width': (0, 4096),
+}
+
+
+class ServiceError(Exception):
+    """A request the service refuses, with the HTTP status to answer."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JobReporter(core.Reporter):
+    """Turns pipeline status and progress into job events."""
+
+    def __init__(self, job):
+        self.job = job
+        self.percent = {}
+
+    def status(self, text, level='info'):
+        self.job.emit('status', text=text, level=level)
+
+    def progress(self, stage, value, maximum=100):
+        # One event per whole percent keeps streams small for long videos
+        percent = int(100 * value / maximum) if maximum else 100
+        if self.percent.get(stage) != percent:
+            self.percent[stage] = percent
+            self.job.emit('progress', stage=stage, percent=percent)
+
+
+class Job:
+    """One conversion request, its workspace and its event log."""
+
+    def __init__(self, workspace, name, settings, priority, output_format):
+        self.id = uuid.uuid4().hex[:12]
+        self.directory = os.path.join(workspace, self.id)
+        self.input_path = os.path.join(self.directory, 'input', os.path.basename(name))
+        self.settings = settings
+        self.priority = priority
+        self.output_format = output_format
+        self.state = QUEUED
+        self.error = None
+        self.outputs = []
+        self.submitted = time.time()
+        self.finished = None
+        self.events = []
+        self.changed = threading.Condition()
+
+    def emit(self, name, **fields):
+        with self.changed:
+            self.events.append(dict(fields, event=name, ts=round(time.time(), 3)))
+            self.changed.notify_all()
+
+    def wait_events(self, start, timeout=1.0):
+        """(events after ``start``, job ended), waiting a while for new events."""
+        with self.changed:
+            if len(self.events) <= start and self.state in (QUEUED, RUNNING):
+                self.changed.wait(timeout)
+            return self.events[start:], self.state not in (QUEUED, RUNNING)
+
+    def finish(self, state, **fields):
+        """End the job; the state changes together with its last event."""
+        with self.changed:
+            self.finished = time.time()
+            self.state = state
+            self.emit(state, **fields)
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'priority': self.priority,
+            'input': os.path.basename(self.input_path),
+            'artifacts': [os.path.basename(path) for path in self.outputs],
+            'error': self.error,
+            'submitted': self.submitted,
+            'finished': self.finished,
+        }
+
+
+class ConversionService:
+    """Runs jobs on warm worker threads fed by a bounded priority queue.
+
+    Workers live for the whole service, so imports, glyph atlases and
+    palette lookup tables are built once instead of per conversion. Each
+    job gets its own workspace directory, so jobs run concurrently
+    without sharing output or intermediate paths.
+    """
+
+    def __init__(self, workspace=DEFAULT_WORKSPACE, workers=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, defaults=None, telemetry_options=()):
+        self.workspace = workspace
+        self.defaults = dict(core.resolve_settings(defaults), open_result=False)
+        self.workers, self.threads = plan_workers(self.defaults, workers)
+        self.telemetry_options = telemetry_options
+        self.queue = queue.PriorityQueue(maxsize=queue_size)
+        self.order = itertools.count()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        os.makedirs(workspace, exist_ok=True)
+        remove_stale_jobs(workspace)
+
+        warm_up()
+        for number in range(self.workers):
+            threading.Thread(target=self._work, name=f'worker-{number}', daemon=True).start()
+
+    def submit(self, name, data, settings=None, priority=DEFAULT_PRIORITY, output_format=None):
+        """Queue a conversion of ``data`` (file contents named ``name``). Returns the job."""
+        if not (core.is_image(name) or core.is_video(name)):
+            raise ServiceError(415, f'Unsupported file type: {name}')
+        # The format names the output file, so only the known ones are taken
+        if output_format is not None and output_format not in OUTPUT_FORMATS:
+            raise ServiceError(400, f'Unsupported output format: {output_format!r}')
+        settings = self.job_settings(settings or {})
+
+        job = Job(self.workspace, name, settings, priority, output_format)
+        os.makedirs(os.path.dirname(job.input_path))
+        with open(job.input_path, 'wb') as f:
+            f.write(data)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait((priority, next(self.order), job))
+        except queue.Full:
+            self._discard(job)
+            raise ServiceError(503, 'Job queue is full, retry later')
+        job.emit('queued', position=self.queue.qsize())
+        self._expire()
+        return job
+
+    def job_settings(self, requested):
+        """The server defaults with a client's per-job settings checked and applied.
+
+        Each job gets at most its share of the cores and the server's
+        memory budget; results never open a viewer.
+        """
+        if not isinstance(requested, dict):
+            raise ServiceError(400, 'Settings must be a JSON object')
+        settings = dict(self.defaults)
+        for name, value in requested.items():
+            if name not in JOB_SETTINGS:
+                raise ServiceError(400, f'Setting {name} cannot be chosen per job')
+            default = self.defaults[name]
+            if isinstance(default, bool):
+                valid = isinstance(value, bool)
+            else:
+                numbers = int if isinstance(default, int) else (int, float)
+                low, high = SETTING_RANGES.get(name, (0, None))
+                valid = (isinstance(value, numbers) and not isinstance(value, bool)
+                         and math.isfinite(value) and value >= low
+                         and (high is None or value <= high))
+            if not valid:
+                raise ServiceError(400, f'Invalid value for {name}: {value!r}')
+            settings[name] = value
+        settings.update(open_result=False,
+                        jobs=min(settings['jobs'] or self.threads, self.threads),
+                        max_memory_mb=min(settings['max_memory_mb'],
+                                          self.defaults['max_memory_mb']))
+        return settings
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise ServiceError(404, f'No job {job_id}')
+        return job
+
+    def delete(self, job_id):
+        """Drop a finished or still queued job and its workspace."""
+        job = self.get(job_id)
+        with job.changed:
+            if job.state == RUNNING:
+                raise ServiceError(409, 'Job is running')
+            if job.state == QUEUED:
+                # Skipped by the worker that dequeues it
+                job.error = 'Cancelled'
+                job.finish(FAILED, error=job.error)
+        self._discard(job)
+
+    def status(self):
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+        return {
+            'workers': self.workers,
+            'threads_per_job': self.threads,
+            'queued': states.count(QUEUED),
+            'running': states.count(RUNNING),
+            'finished': states.count(DONE) + states.count(FAILED),
+        }
+
+    def _discard(self, job):
+        with self.lock:
+            self.jobs.pop(job.id, None)
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def _expire(self):
+        """Delete the oldest finished jobs past MAX_FINISHED_JOBS."""
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values() if job.finished),
+                              key=lambda job: job.finished)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self._discard(job)
+
+    def _work(self):
+        while True:
+            _, _, job = self.queue.get()
+            with job.changed:
+                start = job.state == QUEUED
+                if start:
+                    job.state = RUNNING
+            if start:
+                self._run(job)
+            self.queue.task_done()
+
+    def _run(self, job):
+        job.emit('started')
+        output_path = output_path_for(job.input_path, job.directory, job.output_format)
+        try:
+            outputs = core.convert_file(
+                job.input_path, output_path, job.settings, JobReporter(job),
+                work_dir=os.path.join(job.directory, 'work'),
+                telemetry=create_telemetry(*self.telemetry_options))
+            # Per-frame text directories of videos are served as one zip each
+            job.outputs = [shutil.make_archive(path, 'zip', path) if os.path.isdir(path)
+                           else path for path in outputs]
+            state, job.error = DONE, None
+        except Exception as e:
+            print(f'{ERROR} Job {job.id}: {e}')
+            state, job.error = FAILED, str(e)
+        job.finish(state, artifacts=[os.path.basename(path) for path in job.outputs],
+                   error=job.error)
+
+
+def remove_stale_jobs(workspace):
+    """Delete job workspaces left behind by an earlier run of the service."""
+    for name in os.listdir(workspace):
+        path = os.path.join(workspace, name)
+        if len(name) == 12 and os.path.isdir(path) and all(c in '0123456789abcdef' for c in name):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def warm_up():
+    """Build every glyph atlas and palette lookup table jobs can ask for."""
+    for charset in (CHARSET_SIMPLE, CHARSET_FULL):
+        get_atlas(charset)
+        glyph_palette(False, get_level_atlas(charset)[0])
+    glyph_palette(True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP API of a ConversionService (``self.server.service``).
+
+    POST   /jobs?name=FILE[&priority=N][&format=F][&settings=JSON]  body: file
+    GET    /jobs/ID                  job state and artifact names
+    GET    /jobs/ID/events           newline-delimited JSON events until the job ends
+    GET    /jobs/ID/artifacts/NAME   an output file (directories are zipped)
+    DELETE /jobs/ID                  cancel a queued job or delete a finished one
+    GET    /health                   worker and queue counts
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _route(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        return parts, {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+    def _handle(self, action):
+        try:
+            action()
+        except ServiceError as e:
+            self._send_json({'error': str(e)}, e.status)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+    def _get(self):
+        parts, _ = self._route()
+        service = self.server.service
+        if parts == ['health']:
+            return self._send_json(service.status())
+        if len(parts) == 2 and parts[0] == 'jobs':
+            return self._send_json(service.get(parts[1]).summary())
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            return self._stream_events(service.get(parts[1]))
+        if len(parts) == 4 and parts[0] == 'jobs' and parts[2] == 'artifacts':
+            return self._send_artifact(service.get(parts[1]), parts[3])
+        raise ServiceError(404, 'Not found')
+
+    def _post(self):
+        parts, query = self._route()
+        if parts != ['jobs']:
+            raise ServiceError(404, 'Not found')
+        if 'name' not in query:
+            raise ServiceError(400, 'Missing ?name= of the uploaded file')
+        try:
+            settings = json.loads(query.get('settings', '{}'))
+            priority = int(query.get('priority', DEFAULT_PRIORITY))
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError as e:
+            raise ServiceError(400, f'Bad job parameters: {e}')
+        if length <= 0:
+            raise ServiceError(400, 'Empty upload')
+        data = self.rfile.read(length)
+        job = self.server.service.submit(query['name'], data, settings, priority,
+                                         query.get('format'))
+        self._send_json(job.summary(), 202)
+
+    def _delete(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            raise ServiceError(404, 'Not found')
+        self.server.service.delete(parts[1])
+        self._send_json({'deleted': parts[1]})
+
+    def _stream_events(self, job):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        sent = 0
+        ended = False
+        while not ended:
+            events, ended = job.wait_events(sent)
+            if events:
+                data = ''.join(json.dumps(event) + '\n' for event in events).encode()
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                self.wfile.flush()
+                sent += len(events)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _send_artifact(self, job, name):
+        paths = {os.path.basename(path): path for path in job.outputs}
+        path = paths.get(name)
+        if path is None or not os.path.isfile(path):
+            raise ServiceError(404, f'No artifact {name}')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """Serve a ConversionService until interrupted."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, ServiceHandler)
+        where = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceHandler)
+        where = f'http://{host}:{server.server_address[1]}'
+    server.service = service
+    # Stop cleanly (and remove the socket) when terminated too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f'{OK} Serving on {where} with {service.workers} warm workers '
+          f'({service.threads} threads per job).')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix socket for the local client."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class ServiceClient:
+    """Minimal client for a local service (TCP host/port or Unix socket)."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+
+    def _connection(self):
+        if self.socket_path:
+            return UnixHTTPConnection(self.socket_path)
+        return http.client.HTTPConnection(self.host, self.port)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        connection.request(method, path, body)
+        response = connection.getresponse()
+        if response.status >= 400:
+            message = json.loads(response.read() or b'{}').get('error', response.reason)
+            connection.close()
+            raise Exception(f'{response.status}: {message}')
+        return connection, response
+
+    def _json(self, method, path, body=None):
+        connection, response = self._request(method, path, body)
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def submit(self, file_path, settings=None, priority=DEFAULT_PRIORITY, output_format=None):
+        query = {'name': os.path.basename(file_path), 'priority': priority,
+                 'settings': json.dumps(settings or {})}
+        if output_format:
+            query['format'] = output_format
+        with open(file_path, 'rb') as f:
+            return self._json('POST', '/jobs?' + urlencode(query), f.read())
+
+    def job(self, job_id):
+        return self._json('GET', f'/jobs/{job_id}')
+
+    def health(self):
+        return self._json('GET', '/health')
+
+    def delete(self, job_id):
+        return self._json('DELETE', f'/jobs/{job_id}')
+
+    def events(self, job_id):
+        """Yield job events as they happen, until the job ends."""
+        connection, response = self._request('GET', f'/jobs/{job_id}/events')
+        try:
+            for line in response:
+                yield json.loads(line)
+        finally:
+            connection.close()
+
+    def download(self, job_id, name, destination):
+        connection, response = self._request(
+            'GET', f'/jobs/{job_id}/artifacts/{quote(name)}')
+        try:
+            with open(destination, 'wb') as f:
+                shutil.copyfileobj(response, f, CHUNK_SIZE)
+        except BaseException:
+            # Never leave a truncated artifact behind
+            if os.path.exists(destination):
+                os.remove(destination)
+            raise
+        finally:
+            connection.close()
+        return destination
+
+
+def download_artifacts(client, job, output_dir, file_path):
+    """Download every artifact of a finished job. Returns how many failed."""
+    errors = 0
+    for name in job['artifacts']:
+        try:
+            path = client.download(job['id'], name, os.path.join(output_dir, name))
+            print(f'{OK} {file_path} -> {path}')
+        except Exception as e:
+            errors += 1
+            print(f'{ERROR} {file_path}: download of {name} failed: {e}')
+    return errors
+
+
+def run_client(args):
+    """Submit files, follow their progress and download the artifacts."""
+    client = ServiceClient(args.host, args.port, args.socket)
+    # Cache, cleanup and tiling stay the service's own choice
+    settings = {key: value for key, value in settings_from_args(args).items()
+                if key in JOB_SETTINGS}
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    jobs = [(file_path, client.submit(file_path, settings, args.priority, args.format))
+            for file_path in args.inputs]
+    for file_path, job in jobs:
+        print(f'{INFO} {file_path}: job {job["id"]} queued.')
+        for event in client.events(job['id']):
+            if event['event'] == 'progress':
+                print(f'\r{INFO} {event["stage"]:>8} {event["percent"]:3d}%', end='')
+            elif event['event'] in (DONE, FAILED):
+                print()
+        job = client.job(job['id'])
+        if job['state'] == DONE:
+            errors = download_artifacts(client, job, args.output_dir, file_path)
+        else:
+            errors = 1
+            print(f'{ERROR} {file_path}: {job["error"]}')
+        failed += bool(errors)
+        client.delete(job['id'])
+    return 1 if failed else 0
+
+
+def add_connection_arguments(parser):
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Address to bind/connect to')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'TCP port (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='Use a Unix socket instead of TCP')
+
+
+def main(argv=None):
+    """Service entry point. Returns the process exit code."""
+    parser = argparse.ArgumentParser(
+        prog='ascii-gen-service',
+        description='Run a local conversion service, or submit files to one.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    server = commands.add_parser('serve', help='Run the service')
+    add_connection_arguments(server)
+    server.add_argument('-w', '--workers', type=int, default=None,
+                        help='Jobs run at once (default: usable cores, limited by memory)')
+    server.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Queued jobs accepted before submissions are refused')
+    server.add_argument('--workspace', default=DEFAULT_WORKSPACE,
+                        help='Directory holding one workspace per job')
+    server.add_argument('--metrics', metavar='FILE',
+                        help='Append structured per-stage job events to a JSON-lines file')
+
+    client = commands.add_parser('submit', help='Convert files through a running service')
+    client.add_argument('inputs', nargs='+', help='Image or video files to convert')
+    client.add_argument('--priority', type=int, default=DEFAULT_PRIORITY,
+                        help='Lower runs first (default: %(default)s)')
+    add_connection_arguments(client)
+    add_settings_arguments(client)
+
+    args = parser.parse_args(argv)
+    core.setup_console()
+    if args.command == 'submit':
+        return run_client(args)
+
+    service = ConversionService(args.workspace, args.workers, args.queue_size,
+                                telemetry_options=(args.metrics,))
+    serve(service, args.host, args.port, args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Settings - Conversion settings and supported formats shared by every front end
+Free of heavy imports, so the GUI can build its window before NumPy loads
+"""
+
+import os
+
+
+# Decode prefetch memory ceiling
+DEFAULT_MAX_MEMORY_MB = 512
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ascii-gen')
+DEFAULT_CACHE_SIZE_MB = 1024
+
+DEFAULT_SETTINGS = {
+    'open_result': True,      # Opens result in native viewer when done
+    'cleanup': True,          # File cleaner
+    'full_char': False,       # Uses more characters (bigger output)
+    'color': False,           # Color mode on/off
+    'full_scale': False,      # False = full res, True = smaller/lower res
+    'export_mp4': False,      # Export as MP4 in addition to GIF
+    'export_txt': False,      # Plain text grid (one file per frame for videos)
+    'export_ans': False,      # ANSI colored text (one file per frame for videos)
+    'export_stream': False,   # Delta-encoded character grid stream (.afs)
+    'export_html': False,     # Self-contained HTML/JS player
+    'max_memory_mb': DEFAULT_MAX_MEMORY_MB,  # Decode prefetch memory ceiling
+    'jobs': 0,                # Convert workers (0 = every usable core)
+    'dedup_threshold': 0.0,   # Near-duplicate frame reuse (0 = exact matches only)
+    'cache': True,            # Persistent conversion cache
+    'cache_dir': DEFAULT_CACHE_DIR,
+    'cache_size_mb': DEFAULT_CACHE_SIZE_MB,
+    'start': 0.0,             # Clip start in seconds
+    'end': 0.0,               # Clip end in seconds (0 = end of the video)
+    'max_duration': 0.0,      # Longest clip to convert in seconds (0 = no limit)
+    'stride': 1,              # Keep every n-th frame
+    'target_fps': 0.0,        # Resample to this frame rate (0 = source rate)
+    'columns': 0,             # Grid columns (0 = full scale/SMOL™ preset)
+    'rows': 0,                # Grid rows (0 = follow the aspect ratio)
+    'width': 0,               # Output width in pixels (0 = from columns)
+    'tiled': False,           # Convert images in strips (automatic for huge images)
+}
+
+SUPPORTED_IMAGE_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+SUPPORTED_VIDEO_FORMATS = ('.gif', '.mp4', '.avi', '.mov', '.webm')
+
+
+def resolve_settings(settings=None):
+    """Merge user settings over DEFAULT_SETTINGS, rejecting unknown keys."""
+    resolved = dict(DEFAULT_SETTINGS)
+    if settings:
+        unknown = set(settings) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError(f'Unknown settings: {", ".join(sorted(unknown))}')
+        resolved.update(settings)
+    return resolved
+
+
+def is_image(file_path):
+    return file_path.lower().endswith(SUPPORTED_IMAGE_FORMATS)
+
+
+def is_video(file_path):
+    return file_path.lower().endswith(SUPPORTED_VIDEO_FORMATS)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Test setup - The modules live flat in the repository root
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, 'examples')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark tests - Fixtures are reproducible and never replaced by outputs
+"""
+
+import hashlib
+
+import pytest
+
+import benchmark
+
+
+def digests(fixtures):
+    digest = {}
+    for name, path in fixtures.items():
+        with open(path, 'rb') as f:
+            digest[name] = hashlib.sha1(f.read()).hexdigest()
+    return digest
+
+
+@pytest.fixture(scope='module')
+def fixtures(tmp_path_factory):
+    return benchmark.build_fixtures(str(tmp_path_factory.mktemp('fixtures')), quick=True)
+
+
+def test_quick_fixtures(fixtures):
+    assert sorted(fixtures) == sorted(benchmark.QUICK_FIXTURES)
+
+
+def test_synthetic_frames_are_deterministic():
+    first = benchmark.synthetic_frame(64, 48, 3)
+    assert first.shape == (48, 64, 3)
+    assert (first == benchmark.synthetic_frame(64, 48, 3)).all()
+    assert (first != benchmark.synthetic_frame(64, 48, 4)).any()
+
+
+def test_cases_leave_fixtures_unchanged(fixtures, tmp_path):
+    before = digests(fixtures)
+    for name, path in fixtures.items():
+        case = benchmark.bench_case(name, path, benchmark.settings_combinations(True)[0],
+                                    str(tmp_path))
+        stages = {stage['stage']: stage for stage in case['stages']}
+        assert 'pipeline' in stages and stages['pipeline']['output_bytes']
+    assert digests(fixtures) == before
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Clip tests - Which frames a clip selects, and jobs that select none
+"""
+
+import os
+
+import imageio
+import numpy as np
+import pytest
+
+import core
+from probe import MediaInfo
+from video_reader import Clip
+
+
+# 3 seconds at 10 fps
+VIDEO = MediaInfo(64, 48, 10.0, 30)
+# 4 GIF frames of 100, 200, 300 and 400 ms
+GIF = MediaInfo(64, 48, 4.0, 4, [100, 200, 300, 400])
+
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory):
+    """A real 3 second clip at 10 fps."""
+    path = str(tmp_path_factory.mktemp('video') / 'clip.mp4')
+    writer = imageio.get_writer(path, fps=10, codec='libx264', macro_block_size=1)
+    for index in range(30):
+        writer.append_data(np.full((48, 64, 3), index * 8, dtype=np.uint8))
+    writer.close()
+    return path
+
+
+@pytest.mark.parametrize('arguments', [
+    {'start': -1}, {'end': -1}, {'max_duration': -1}, {'stride': 0}, {'fps': -1},
+    {'start': 2, 'end': 2}, {'start': 2, 'end': 1},
+])
+def test_invalid_clip(arguments):
+    with pytest.raises(ValueError):
+        Clip(**arguments)
+
+
+@pytest.mark.parametrize('arguments, frames, fps', [
+    ({}, 30, 10.0),
+    ({'start': 1}, 20, 10.0),
+    ({'start': 1, 'end': 2}, 10, 10.0),
+    ({'start': 2.5, 'max_duration': 5}, 5, 10.0),
+    ({'end': 10}, 30, 10.0),
+    ({'stride': 3}, 10, 10 / 3),
+    ({'fps': 5}, 15, 5.0),
+    # Never resampled above the source rate
+    ({'fps': 50}, 30, 10.0),
+])
+def test_plan_video(arguments, frames, fps):
+    info = Clip(**arguments).plan(VIDEO)
+    assert info.frame_count == frames
+    assert info.fps == pytest.approx(fps)
+
+
+@pytest.mark.parametrize('start', [3, 10])
+def test_plan_video_past_the_end(start):
+    with pytest.raises(Exception, match='No frames'):
+        Clip(start=start).plan(VIDEO)
+
+
+def test_plan_video_of_unknown_length():
+    info = Clip(start=10, max_duration=2).plan(MediaInfo(64, 48, 10.0))
+    assert info.frame_count == 20
+    assert Clip().plan(MediaInfo(64, 48, 10.0)).frame_count is None
+
+
+@pytest.mark.parametrize('arguments, selection', [
+    ({}, [(0, 100), (1, 200), (2, 300), (3, 400)]),
+    # Frames cut by the window keep only their visible part
+    ({'start': 0.15, 'end': 0.7}, [(1, 150), (2, 300), (3, 100)]),
+    ({'stride': 2}, [(0, 300), (2, 700)]),
+    ({'fps': 2}, [(0, 500), (2, 500)]),
+])
+def test_plan_gif(arguments, selection):
+    clip = Clip(**arguments)
+    info = clip.plan(GIF, gif=True)
+    assert [index for index, _ in clip.selection] == [index for index, _ in selection]
+    assert info.durations == pytest.approx([length for _, length in selection])
+    assert info.frame_count == len(selection)
+
+
+def test_plan_gif_past_the_end():
+    with pytest.raises(Exception, match='No frames'):
+        Clip(start=1).plan(GIF, gif=True)
+
+
+def test_ffmpeg_params():
+    clip = Clip(start=1.5, end=4, stride=2, size=(80, 40))
+    assert clip.ffmpeg_params(10.0) == (
+        ['-ss', '1.500'], ['-t', '2.500', '-vf', 'fps=5.000000,scale=80:40:flags=area'])
+    assert Clip().ffmpeg_params(10.0) == ([], [])
+
+
+def test_convert_video_past_the_end_fails(video, tmp_path):
+    settings = dict(core.DEFAULT_SETTINGS, start=10.0, cache=False, open_result=False)
+    output = str(tmp_path / 'clip.gif')
+    with pytest.raises(Exception, match='No frames'):
+        core.convert_file(video, output, settings, work_dir=str(tmp_path / 'work'))
+    assert not os.path.exists(output)
+
+
+def test_convert_video_without_decoded_frames_fails(video, tmp_path, monkeypatch):
+    # A probe that overestimates the length lets the clip start past the last frame
+    monkeypatch.setattr(core, 'probe', lambda path: MediaInfo(64, 48, 10.0, 100))
+    settings = dict(core.DEFAULT_SETTINGS, start=5.0, cache=False, open_result=False)
+    output = str(tmp_path / 'clip.gif')
+    with pytest.raises(Exception, match='No frames decoded'):
+        core.convert_file(video, output, settings, work_dir=str(tmp_path / 'work'))
+    assert not os.path.exists(output)
+
+
+def test_convert_video_clip(video, tmp_path):
+    settings = dict(core.DEFAULT_SETTINGS, start=2.0, cache=False, open_result=False)
+    output = str(tmp_path / 'clip.gif')
+    assert core.convert_file(video, output, settings, work_dir=str(tmp_path / 'work')) == [output]
+    assert os.path.getsize(output) > 0
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Core tests - Interrupted video jobs clean up their outputs and resume exactly
+"""
+
+import os
+
+import pytest
+
+import core
+import encoders
+import frame_store
+from conftest import EXAMPLES
+
+
+SOURCE = os.path.join(EXAMPLES, 'fractal.gif')
+
+
+def job_settings(**overrides):
+    settings = dict(core.DEFAULT_SETTINGS, columns=40, cache=False, open_result=False)
+    settings.update(overrides)
+    return settings
+
+
+def interrupt_after(monkeypatch, frames):
+    """Make the GIF writer raise KeyboardInterrupt once ``frames`` were written."""
+    write = encoders.GifWriter.write
+    written = []
+
+    def interrupted(self, frame, duration):
+        if len(written) == frames:
+            raise KeyboardInterrupt
+        written.append(frame)
+        write(self, frame, duration)
+
+    monkeypatch.setattr(encoders.GifWriter, 'write', interrupted)
+
+
+def test_interrupt_removes_outputs_and_resumes(tmp_path, monkeypatch):
+    settings = job_settings(export_txt=True)
+    output = str(tmp_path / 'fractal.gif')
+    work_dir = str(tmp_path / 'work')
+
+    interrupt_after(monkeypatch, 5)
+    with pytest.raises(KeyboardInterrupt):
+        core.convert_file(SOURCE, output, settings, work_dir=work_dir)
+    # Only the resumable frame store is left
+    assert os.listdir(tmp_path) == ['work']
+    assert os.listdir(work_dir) == [frame_store.STORE_NAME]
+
+    monkeypatch.undo()
+    outputs = core.convert_file(SOURCE, output, settings, work_dir=work_dir)
+    assert outputs == [output, str(tmp_path / 'fractal_txt')]
+    assert not os.path.exists(work_dir)
+
+    fresh = str(tmp_path / 'fresh' / 'fractal.gif')
+    os.makedirs(os.path.dirname(fresh))
+    core.convert_file(SOURCE, fresh, settings, work_dir=str(tmp_path / 'fresh' / 'work'))
+    with open(output, 'rb') as resumed, open(fresh, 'rb') as clean:
+        assert resumed.read() == clean.read()
+    assert (sorted(os.listdir(tmp_path / 'fractal_txt'))
+            == sorted(os.listdir(tmp_path / 'fresh' / 'fractal_txt')))
+
+
+def test_failed_cleanup_keeps_original_error(tmp_path, monkeypatch):
+    interrupt_after(monkeypatch, 2)
+    monkeypatch.setattr(encoders.GifWriter, 'close', lambda self: 1 / 0)
+    with pytest.raises(KeyboardInterrupt):
+        core.convert_file(SOURCE, str(tmp_path / 'fractal.gif'), job_settings(export_txt=True),
+                          work_dir=str(tmp_path / 'work'))
+    assert not os.path.exists(tmp_path / 'fractal_txt')
+
+
+@pytest.mark.parametrize('changed', [
+    {'color': True}, {'full_char': True}, {'columns': 41}, {'dedup_threshold': 0.1},
+    {'start': 0.5}, {'stride': 2},
+])
+def test_resume_signature_follows_grid_settings(changed):
+    assert (frame_store.job_signature(SOURCE, job_settings())
+            != frame_store.job_signature(SOURCE, job_settings(**changed)))
+
+
+def test_resume_signature_ignores_output_settings():
+    assert (frame_store.job_signature(SOURCE, job_settings())
+            == frame_store.job_signature(SOURCE, job_settings(export_mp4=True, export_txt=True)))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Disk cache tests - Stage key invalidation, LRU eviction and cached cells
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from disk_cache import ConversionCache
+from frame_store import CELLS
+from job_graph import STAGE_NAMES, stage_keys
+from settings import DEFAULT_SETTINGS
+
+
+KEY_LENGTH = 40
+
+
+def changed_stages(**changed):
+    """Stages whose key changes when the settings change."""
+    before = stage_keys('source', DEFAULT_SETTINGS)
+    after = stage_keys('source', dict(DEFAULT_SETTINGS, **changed))
+    return [stage for stage in STAGE_NAMES if before[stage] != after[stage]]
+
+
+@pytest.mark.parametrize('changed, first', [
+    ({'start': 1.0}, 'decode'),
+    ({'stride': 2}, 'decode'),
+    ({'columns': 100}, 'downscale'),
+    ({'dedup_threshold': 0.1}, 'downscale'),
+    ({'full_char': True}, 'grid'),
+    ({'color': True}, 'grid'),
+])
+def test_setting_invalidates_its_stage_and_later_ones(changed, first):
+    assert changed_stages(**changed) == list(STAGE_NAMES[STAGE_NAMES.index(first):])
+
+
+def test_output_settings_share_every_key():
+    assert changed_stages(export_mp4=True, export_txt=True, cache_dir='/elsewhere') == []
+
+
+def test_keys_follow_the_source():
+    keys = stage_keys('source', DEFAULT_SETTINGS)
+    other = stage_keys('other', DEFAULT_SETTINGS)
+    assert all(len(key) == KEY_LENGTH and key != other[stage] for stage, key in keys.items())
+
+
+def store(cache, tmp_path, key, size, mtime):
+    source = tmp_path / 'artifact'
+    source.write_bytes(b'x' * size)
+    cache.store_artifact(key, 'output.gif', str(source))
+    os.utime(os.path.join(cache.cache_dir, key), (mtime, mtime))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'), max_size_mb=2.5 / 1024)
+    old, used, new = ('a' * KEY_LENGTH, 'b' * KEY_LENGTH, 'c' * KEY_LENGTH)
+    store(cache, tmp_path, old, 1024, 1000)
+    store(cache, tmp_path, used, 1024, 2000)
+    # Reading refreshes an entry
+    assert cache.fetch_artifact(old, 'output.gif', str(tmp_path / 'fetched.gif'))
+    store(cache, tmp_path, new, 1024, 3000)
+
+    assert not cache.has_artifact(used, 'output.gif')
+    assert cache.has_artifact(old, 'output.gif') and cache.has_artifact(new, 'output.gif')
+    assert cache.stats()['entries'] == 2
+
+
+def test_eviction_keeps_foreign_directories(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'), max_size_mb=0)
+    foreign = tmp_path / 'cache' / 'notes'
+    (foreign / 'nested').mkdir(parents=True)
+    (foreign / 'nested' / 'file.txt').write_bytes(b'x' * 4096)
+    source = tmp_path / 'artifact'
+    source.write_bytes(b'x' * 1024)
+    cache.store_artifact('d' * KEY_LENGTH, 'output.gif', str(source))
+    assert foreign.exists() and cache.stats()['entries'] == 0
+
+
+def test_entry_size_includes_nested_files(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    nested = tmp_path / 'cache' / ('e' * KEY_LENGTH) / 'frames_txt'
+    nested.mkdir(parents=True)
+    (nested / 'frame00000.txt').write_bytes(b'x' * (1024 * 1024))
+    assert cache.stats()['size_mb'] == 1.0
+
+
+def test_cells_round_trip(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    key = 'f' * KEY_LENGTH
+    assert cache.load_cells(key) is None
+
+    frames = [np.full((2, 3, 3), index, dtype=np.uint8) for index in range(4)]
+    writer = cache.cells_writer(key)
+    for cells in frames:
+        writer.append(cells)
+    assert writer.commit()
+
+    with cache.load_cells(key) as stored:
+        assert stored.complete([CELLS]) == len(frames)
+        for index, cells in enumerate(frames):
+            assert (stored.get(CELLS, index) == cells).all()
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_incomplete_cells_are_not_stored(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    key = '0' * KEY_LENGTH
+    writer = cache.cells_writer(key)
+    writer.append(np.zeros((2, 3, 3), dtype=np.uint8))
+    writer.append(None)
+    assert not writer.commit()
+    assert cache.load_cells(key) is None
+    assert os.listdir(os.path.join(cache.cache_dir, key)) == []
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Encoder tests - The streaming GIF writer decodes back to the frames it was given
+"""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+import ascii_engine
+from encoders import GifWriter, Palette, glyph_palette
+
+
+CELL = (4, 3)
+SIZE = (5 * CELL[0], 7 * CELL[1])
+
+
+def indexed_frames(palette, count, seed=0):
+    """Frames of random cells where each frame changes a few cells of the last."""
+    rng = np.random.default_rng(seed)
+    rows, columns = SIZE[0] // CELL[0], SIZE[1] // CELL[1]
+    cells = rng.integers(0, palette.transparent, size=(rows, columns))
+    frames = []
+    for _ in range(count):
+        for _ in range(rng.integers(1, 4)):
+            cells[rng.integers(rows), rng.integers(columns)] = rng.integers(palette.transparent)
+        pixels = np.repeat(np.repeat(cells, CELL[0], axis=0), CELL[1], axis=1)
+        # Some noise inside cells, like anti-aliased glyphs
+        noise = rng.integers(0, palette.transparent, size=pixels.shape)
+        pixels = np.where(rng.random(pixels.shape) < 0.2, noise, pixels)
+        frames.append(pixels.astype(np.uint8))
+    return frames
+
+
+def decode(path):
+    """(RGB frames, durations in ms) as a viewer shows them."""
+    with Image.open(path) as image:
+        frames = [np.asarray(frame.convert('RGB')) for frame in ImageSequence.Iterator(image)]
+        image.seek(0)
+        durations = []
+        for index in range(image.n_frames):
+            image.seek(index)
+            durations.append(image.info['duration'])
+    return frames, durations
+
+
+@pytest.mark.parametrize('palette', [glyph_palette(True), glyph_palette(False)],
+                         ids=['color', 'mono'])
+def test_gif_round_trip(tmp_path, palette):
+    frames = indexed_frames(palette, 12)
+    path = str(tmp_path / 'out.gif')
+    writer = GifWriter(path, palette, CELL)
+    for frame in frames:
+        writer.write(frame, 100)
+    writer.close()
+
+    decoded, durations = decode(path)
+    assert len(decoded) == len(frames)
+    for frame, pixels in zip(frames, decoded):
+        assert (pixels == palette.expand(frame)).all()
+    assert durations == [100] * len(frames)
+
+
+def test_gif_merges_identical_frames(tmp_path):
+    palette = glyph_palette(True)
+    first, second = indexed_frames(palette, 2)
+    path = str(tmp_path / 'out.gif')
+    writer = GifWriter(path, palette, CELL)
+    for frame, duration in [(first, 40), (first, 40), (first, 40), (second, 50)]:
+        writer.write(frame, duration)
+    writer.close()
+
+    decoded, durations = decode(path)
+    assert len(decoded) == 2 and writer.frames_written == 2
+    assert durations == [120, 50]
+    assert (decoded[1] == palette.expand(second)).all()
+
+
+def test_gif_carries_delay_rounding(tmp_path):
+    palette = glyph_palette(True)
+    frames = indexed_frames(palette, 6)
+    path = str(tmp_path / 'out.gif')
+    writer = GifWriter(path, palette, CELL)
+    for frame in frames:
+        writer.write(frame, 1000 / 30)
+    writer.close()
+
+    _, durations = decode(path)
+    # GIF delays are in 10 ms units; the total stays exact
+    assert all(duration % 10 == 0 for duration in durations)
+    assert sum(durations) == 200
+
+
+def test_palette_needs_a_transparent_slot():
+    with pytest.raises(ValueError):
+        Palette(np.zeros((256, 3), dtype=np.uint8))
+
+
+def test_level_atlas_is_quantized_to_a_palette(monkeypatch):
+    atlas = np.arange(256, dtype=np.uint8).reshape(1, 16, 16)
+    monkeypatch.setattr(ascii_engine, 'get_atlas', lambda charset, size: atlas)
+    levels, level_atlas = ascii_engine.get_level_atlas.__wrapped__('x', 12)
+
+    assert len(levels) == ascii_engine.MAX_LEVELS and levels[0] == 0 and levels[-1] == 255
+    assert np.abs(levels[level_atlas].astype(int) - atlas).max() <= 1
+    palette = glyph_palette(False, levels)
+    assert palette.transparent == ascii_engine.MAX_LEVELS
+    # Every gray maps to the nearest palette gray
+    gray = np.repeat(np.arange(256, dtype=np.uint8)[None, :, None], 3, axis=2)
+    assert np.abs(palette.expand(palette.index(gray))[0, :, 0].astype(int)
+                  - np.arange(256)).max() <= 1
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Service tests - Per-job input validation and artifacts of the conversion service
+"""
+
+import http.client
+import json
+import os
+import threading
+import zipfile
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import pytest
+
+from conftest import EXAMPLES
+from service import DONE, ConversionService, ServiceClient, ServiceError, ServiceHandler
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    return ConversionService(str(tmp_path_factory.mktemp('workspace')), workers=1)
+
+
+@pytest.fixture(scope='module')
+def server(service):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ServiceHandler)
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, query, body, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request('POST', '/jobs?' + urlencode(query), body, headers or {})
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def wait(job):
+    """Block until a job has ended."""
+    seen = 0
+    ended = False
+    while not ended:
+        events, ended = job.wait_events(seen)
+        seen += len(events)
+
+
+@pytest.mark.parametrize('requested', [
+    {'cache_dir': '/tmp/elsewhere'},
+    {'cleanup': False},
+    {'tiled': True},
+    {'color': 1},
+    {'jobs': '4'},
+    {'columns': 80.5},
+    {'columns': 5000},
+    {'rows': 100000},
+    {'width': 1 << 20},
+    {'stride': 0},
+    {'start': -1.0},
+    {'start': float('inf')},
+    {'target_fps': float('nan')},
+    {'dedup_threshold': 2.0},
+    ['columns', 80],
+])
+def test_job_settings_rejects(service, requested):
+    with pytest.raises(ServiceError) as error:
+        service.job_settings(requested)
+    assert error.value.status == 400
+
+
+def test_job_settings_pins_server_limits(service):
+    settings = service.job_settings({'columns': 120, 'stride': 2, 'jobs': 1000,
+                                     'max_memory_mb': 1 << 20, 'start': 1})
+    assert settings['columns'] == 120 and settings['stride'] == 2 and settings['start'] == 1
+    assert settings['jobs'] == service.threads
+    assert settings['max_memory_mb'] == service.defaults['max_memory_mb']
+    assert settings['cache_dir'] == service.defaults['cache_dir']
+    assert settings['open_result'] is False
+
+
+@pytest.mark.parametrize('output_format', ['png', 'txt/../../escaped', '../txt', ''])
+def test_submit_rejects_unknown_format(service, output_format):
+    with pytest.raises(ServiceError) as error:
+        service.submit('logo.png', b'data', output_format=output_format)
+    assert error.value.status == 400
+    assert not service.jobs
+
+
+def test_post_rejects_path_in_format(server, tmp_path):
+    escaped = tmp_path / 'escaped'
+    with open(os.path.join(EXAMPLES, 'logo.png'), 'rb') as f:
+        data = f.read()
+    status, payload = post(server, {'name': 'logo.png',
+                                    'format': f'txt/../../../../../..{escaped}'}, data)
+    assert status == 400 and 'format' in payload['error']
+    assert not os.path.exists(escaped)
+
+
+def test_post_rejects_bad_content_length(server):
+    status, payload = post(server, {'name': 'logo.png'}, b'data', {'Content-Length': 'abc'})
+    assert status == 400
+
+
+def test_video_text_directory_is_served_as_zip(service, server, tmp_path):
+    client = ServiceClient(*server.server_address)
+    summary = client.submit(os.path.join(EXAMPLES, 'fractal.gif'),
+                            {'columns': 20, 'max_duration': 0.3, 'cache': False},
+                            output_format='txt')
+    wait(service.get(summary['id']))
+    job = client.job(summary['id'])
+    assert job['state'] == DONE
+    assert job['artifacts'] == ['fractal_txt.zip']
+
+    path = client.download(job['id'], job['artifacts'][0], str(tmp_path / 'frames.zip'))
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+    assert names and all(name.endswith('.txt') for name in names)
+    client.delete(job['id'])
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+Text Formats - Output writers that store character grids instead of pixels
+Plain text, ANSI, a delta-encoded frame stream and a self-contained HTML player
+"""
+
+import base64
+import html
+import io
+import os
+import struct
+import zlib
+
+import numpy as np
+
+
+# Cell colors are rounded to this many bits per channel so neighbouring
+# cells share escape codes; invisible at terminal glyph sizes
+COLOR_BITS = 5
+RESET = '\x1b[0m'
+
+STREAM_EXTENSION = '.afs'
+STREAM_MAGIC = b'ASCS'
+STREAM_VERSION = 1
+KEY_FRAME, DELTA_FRAME = 0, 1
+# A key frame every N frames bounds how far a reader must replay to seek
+KEY_FRAME_INTERVAL = 300
+# Stream colors keep 4 bits per channel (still far finer than the GIF's
+# 6x7x6 cube); sensor noise would otherwise make every cell a delta
+STREAM_COLOR_BITS = 4
+
+HTML_FONT_SIZE = 12
+
+
+def grid_to_lines(indices, colors, charset):
+    """Turn a character grid into one ANSI string per row.
+
+    In color mode a truecolor escape is emitted only where the (rounded)
+    cell color changes along the row.
+    """
+    chars = np.array(list(charset))[indices]
+    if colors is None:
+        return [''.join(row) for row in chars.tolist()]
+
+    shift = 8 - COLOR_BITS
+    rounded = (colors >> shift) << shift
+    changed = np.ones(indices.shape, dtype=bool)
+    changed[:, 1:] = (rounded[:, 1:] != rounded[:, :-1]).any(axis=2)
+
+    lines = []
+    for row_chars, row_colors, row_changed in zip(chars.tolist(), rounded.tolist(),
+                                                  changed.tolist()):
+        parts = []
+        for char, (r, g, b), change in zip(row_chars, row_colors, row_changed):
+            if change:
+                parts.append(f'\x1b[38;2;{r};{g};{b}m')
+            parts.append(char)
+        parts.append(RESET)
+        lines.append(''.join(parts))
+    return lines
+
+
+def grid_text(indices, colors, charset, ansi=False):
+    """A whole grid as text, with ANSI colors when ``ansi`` is set."""
+    return '\n'.join(grid_to_lines(indices, colors if ansi else None, charset)) + '\n'
+
+
+class TextWriter:
+    """Writes the grid of a still image as a .txt or .ans file."""
+
+    grid_input = True
+
+    def __init__(self, path, charset, ansi=False):
+        self.path = path
+        self.charset = charset
+        self.ansi = ansi
+        self.grid = None
+
+    def write(self, grid, duration):
+        self.grid = grid
+
+    def close(self):
+        if self.grid is not None:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(grid_text(*self.grid, self.charset, self.ansi))
+            self.grid = None
+
+
+class TextFramesWriter:
+    """Writes every frame of a video as frame<N>.txt/.ans into a directory."""
+
+    grid_input = True
+
+    def __init__(self, path, charset, ansi=False):
+        self.path = path
+        self.charset = charset
+        self.ansi = ansi
+        self.extension = '.ans' if ansi else '.txt'
+        self.frames_written = 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith('frame') and name.endswith(self.extension):
+                os.remove(os.path.join(path, name))
+
+    def write(self, grid, duration):
+        name = f'frame{self.frames_written:05d}{self.extension}'
+        with open(os.path.join(self.path, name), 'w', encoding='utf-8') as f:
+            f.write(grid_text(*grid, self.charset, self.ansi))
+        self.frames_written += 1
+
+    def close(self):
+        pass
+
+
+class FrameStreamWriter:
+    """Streams character and color grids into one zlib-compressed file.
+
+    Layout (little endian, everything inside one zlib stream):
+    magic, version, flags (bit 0: color), columns, rows, charset length and
+    UTF-8 charset, then per frame: duration (ms, u32), type (u8) and either
+    a key frame (every index, then every RGB color) or a delta frame (a
+    packed bit mask of changed cells, then their indices and colors).
+    Colors are rounded to STREAM_COLOR_BITS, spread over the 0-255 range.
+    """
+
+    grid_input = True
+
+    def __init__(self, path, charset, color, file=None):
+        self.path = path
+        self.charset = charset
+        self.color = color
+        self.file = file
+        self.compressor = zlib.compressobj(9)
+        self.previous = None
+        self.delay_error = 0.0
+        self.frames_written = 0
+
+    def _open(self, rows, columns):
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+        charset = self.charset.encode('utf-8')
+        header = (STREAM_MAGIC + struct.pack('<BBHHH', STREAM_VERSION, int(bool(self.color)),
+                                             columns, rows, len(charset)) + charset)
+        self.file.write(self.compressor.compress(header))
+
+    def write(self, grid, duration):
+        indices, colors = grid
+        if self.previous is None:
+            self._open(*indices.shape)
+        if self.color:
+            levels = (1 << STREAM_COLOR_BITS) - 1
+            colors = ((colors >> (8 - STREAM_COLOR_BITS)) * (255 // levels)).astype(np.uint8)
+
+        # Carry rounding error so the total timing stays exact
+        exact = duration + self.delay_error
+        delay = max(1, int(round(exact)))
+        self.delay_error = exact - delay
+
+        if self.previous is None or self.frames_written % KEY_FRAME_INTERVAL == 0:
+            parts = [struct.pack('<IB', delay, KEY_FRAME), indices.tobytes()]
+            if self.color:
+                parts.append(colors.tobytes())
+        else:
+            previous_indices, previous_colors = self.previous
+            changed = indices != previous_indices
+            if self.color:
+                changed |= (colors != previous_colors).any(axis=2)
+            parts = [struct.pack('<IB', delay, DELTA_FRAME),
+                     np.packbits(changed).tobytes(), indices[changed].tobytes()]
+            if self.color:
+                parts.append(colors[changed].tobytes())
+
+        self.file.write(self.compressor.compress(b''.join(parts)))
+        self.previous = indices, colors
+        self.frames_written += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.write(self.compressor.flush())
+            if self.path is not None:
+                self.file.close()
+            self.file = None
+
+
+def read_frame_stream(path):
+    """Yield (indices, colors or None, duration_ms) from a frame stream file."""
+    with open(path, 'rb') as f:
+        data = zlib.decompress(f.read())
+    if data[:4] != STREAM_MAGIC:
+        raise Exception(f'Not an ASCII frame stream: {path}')
+    version, flags, columns, rows, length = struct.unpack('<BBHHH', data[4:12])
+    if version != STREAM_VERSION:
+        raise Exception(f'Unsupported frame stream version {version}')
+    color = bool(flags & 1)
+    position = 12 + length
+    cells = rows * columns
+    mask_bytes = (cells + 7) // 8
+    indices = np.zeros((rows, columns), dtype=np.uint8)
+    colors = np.zeros((rows, columns, 3), dtype=np.uint8) if color else None
+
+    while position < len(data):
+        duration, kind = struct.unpack('<IB', data[position:position + 5])
+        position += 5
+        if kind == KEY_FRAME:
+            indices = np.frombuffer(data, np.uint8, cells, position).reshape(rows, columns).copy()
+            position += cells
+            if color:
+                colors = np.frombuffer(data, np.uint8, cells * 3,
+                                       position).reshape(rows, columns, 3).copy()
+                position += cells * 3
+        else:
+            changed = np.unpackbits(np.frombuffer(data, np.uint8, mask_bytes, position),
+                                    count=cells).astype(bool).reshape(rows, columns)
+            position += mask_bytes
+            count = int(changed.sum())
+            indices = indices.copy()
+            indices[changed] = np.frombuffer(data, np.uint8, count, position)
+            position += count
+            if color:
+                colors = colors.copy()
+                colors[changed] = np.frombuffer(data, np.uint8, count * 3,
+                                                position).reshape(count, 3)
+                position += count * 3
+        yield indices, colors, duration
+
+
+class HtmlPlayerWriter:
+    """A single HTML file that plays an embedded frame stream on a canvas."""
+
+    grid_input = True
+
+    def __init__(self, path, charset, color):
+        self.path = path
+        self.buffer = io.BytesIO()
+        self.stream = FrameStreamWriter(None, charset, color, file=self.buffer)
+
+    def write(self, grid, duration):
+        self.stream.write(grid, duration)
+
+    def close(self):
+        if self.stream.file is None:
+            return
+        self.stream.close()
+        data = base64.b64encode(self.buffer.getvalue()).decode('ascii')
+        title = html.escape(os.path.splitext(os.path.basename(self.path))[0])
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(HTML_TEMPLATE.replace('{title}', title)
+                    .replace('{font_size}', str(HTML_FONT_SIZE))
+                    .replace('{data}', data))
+
+
+HTML_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body { background: #000; margin: 0; display: flex; align-items: center;
+       justify-content: center; min-height: 100vh; }
+canvas { cursor: pointer; }
+</style>
+</head>
+<body>
+<canvas id="screen" title="Click to pause"></canvas>
+<script>
+const DATA = '{data}';
+const FONT_SIZE = {font_size};
+
+(async () => {
+  const packed = Uint8Array.from(atob(DATA), c => c.charCodeAt(0));
+  const inflated = new Blob([packed]).stream().pipeThrough(new DecompressionStream('deflate'));
+  const data = new Uint8Array(await new Response(inflated).arrayBuffer());
+  const view = new DataView(data.buffer);
+
+  const color = data[5] & 1;
+  const columns = view.getUint16(6, true), rows = view.getUint16(8, true);
+  const length = view.getUint16(10, true);
+  const chars = [...new TextDecoder().decode(data.subarray(12, 12 + length))];
+  const cells = columns * rows, maskBytes = (cells + 7) >> 3;
+  const bits = n => { let c = 0; while (n) { c += n & 1; n >>= 1; } return c; };
+
+  // Index the frames once: offset, type and duration
+  const frames = [];
+  let position = 12 + length;
+  while (position < data.length) {
+    const duration = view.getUint32(position, true), kind = data[position + 4];
+    position += 5;
+    frames.push({ duration, kind, offset: position });
+    if (kind === 0) {
+      position += cells * (color ? 4 : 1);
+    } else {
+      let count = 0;
+      for (let i = 0; i < maskBytes; i++) count += bits(data[position + i]);
+      position += maskBytes + count * (color ? 4 : 1);
+    }
+  }
+
+  const canvas = document.getElementById('screen');
+  const context = canvas.getContext('2d');
+  const font = FONT_SIZE + 'px monospace';
+  context.font = font;
+  const cellWidth = Math.ceil(context.measureText('M').width);
+  const cellHeight = Math.ceil(FONT_SIZE * 1.2);
+  canvas.width = columns * cellWidth;
+  canvas.height = rows * cellHeight;
+  context.font = font;
+  context.textBaseline = 'top';
+
+  const indices = new Uint8Array(cells), rgb = new Uint8Array(cells * 3);
+  const draw = cell => {
+    const x = (cell % columns) * cellWidth, y = Math.floor(cell / columns) * cellHeight;
+    context.fillStyle = '#000';
+    context.fillRect(x, y, cellWidth, cellHeight);
+    const char = chars[indices[cell]];
+    if (char === ' ') return;
+    context.fillStyle = color
+      ? `rgb(${rgb[cell * 3]},${rgb[cell * 3 + 1]},${rgb[cell * 3 + 2]})` : '#fff';
+    context.fillText(char, x, y);
+  };
+
+  const show = frame => {
+    let offset = frame.offset;
+    if (frame.kind === 0) {
+      indices.set(data.subarray(offset, offset + cells));
+      if (color) rgb.set(data.subarray(offset + cells, offset + cells * 4));
+      for (let cell = 0; cell < cells; cell++) draw(cell);
+      return;
+    }
+    const mask = offset;
+    offset += maskBytes;
+    const changed = [];
+    for (let cell = 0; cell < cells; cell++) {
+      if ((data[mask + (cell >> 3)] >> (7 - (cell & 7))) & 1) changed.push(cell);
+    }
+    changed.forEach((cell, i) => {
+      indices[cell] = data[offset + i];
+      if (color) rgb.set(data.subarray(offset + changed.length + i * 3,
+                                       offset + changed.length + i * 3 + 3), cell * 3);
+      draw(cell);
+    });
+  };
+
+  let current = 0, paused = false, timer = null;
+  const tick = () => {
+    show(frames[current]);
+    if (frames.length < 2) return;
+    timer = setTimeout(() => { current = (current + 1) % frames.length; tick(); },
+                       frames[current].duration);
+  };
+  canvas.addEventListener('click', () => {
+    paused = !paused;
+    if (paused) { clearTimeout(timer); }
+    else { current = (current + 1) % frames.length; tick(); }
+  });
+  tick();
+})();
+</script>
+</body>
+</html>
+'''
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Video Reader - Streaming, bounded-memory frame decoding
+Frames are decoded on a background thread into a bounded prefetch queue
+"""
+
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from probe import MediaInfo
+from settings import DEFAULT_MAX_MEMORY_MB
+
+
+MAX_PREFETCH = 64
+
+_END = object()
+
+
+class Clip:
+    """The part of a video to decode: time range, frame sampling and frame size.
+
+    Times are in seconds; 0 means "not set". ``stride`` keeps every n-th
+    frame and ``fps`` resamples to a target rate (never above the source).
+    ``size`` asks the decoder for frames already scaled to (width, height).
+    """
+
+    def __init__(self, start=0.0, end=0.0, max_duration=0.0, stride=1, fps=0.0, size=None):
+        if start < 0 or end < 0 or max_duration < 0 or stride < 1 or fps < 0:
+            raise ValueError('Clip times and rates must be positive')
+        if end and end <= start:
+            raise ValueError(f'Clip end ({end}s) must be after its start ({start}s)')
+        self.start = start
+        self.end = end
+        self.max_duration = max_duration
+        self.stride = stride
+        self.fps = fps
+        self.size = size
+        self.selection = None  # GIF only: [(source index, duration ms)]
+
+    @classmethod
+    def from_settings(cls, settings, size=None):
+        return cls(settings['start'], settings['end'], settings['max_duration'],
+                   settings['stride'], settings['target_fps'], size)
+
+    @property
+    def limit(self):
+        """Seconds to decode after ``start`` (None = until the end)."""
+        limits = [self.end - self.start] if self.end else []
+        if self.max_duration:
+            limits.append(self.max_duration)
+        return min(limits) if limits else None
+
+    @property
+    def is_full(self):
+        return not (self.start or self.limit or self.stride > 1 or self.fps or self.size)
+
+    def output_fps(self, source_fps):
+        """Frame rate after sampling, or None when every frame is kept."""
+        if self.fps:
+            return min(self.fps, source_fps)
+        if self.stride > 1:
+            return source_fps / self.stride
+        return None
+
+    def plan(self, info, gif=False):
+        """Metadata of the frames this clip yields from a probed source."""
+        if gif and info.durations:
+            return self._plan_gif(info)
+
+        duration = info.frame_count / info.fps if info.frame_count and info.fps else None
+        if duration is not None:
+            if self.start >= duration:
+                raise Exception(f'No frames between {self.start}s and {duration:.2f}s')
+            duration -= self.start
+            if self.limit is not None:
+                duration = min(duration, self.limit)
+        elif self.limit is not None:
+            duration = self.limit
+        fps = self.output_fps(info.fps) or info.fps
+        frame_count = max(1, int(round(duration * fps))) if duration is not None else None
+        return MediaInfo(info.width, info.height, fps, frame_count)
+
+    def _plan_gif(self, info):
+        """Pick GIF frames by timestamp; skipped frames still have to be decoded."""
+        start_ms = self.start * 1000
+        starts = np.concatenate([[0], np.cumsum(info.durations)[:-1]])
+        total = sum(info.durations)
+        end_ms = total if self.limit is None else min(total, start_ms + self.limit * 1000)
+
+        # Frames overlapping the window, with their visible part only
+        window = [(index, min(begin + length, end_ms) - max(begin, start_ms))
+                  for index, (begin, length) in enumerate(zip(starts, info.durations))
+                  if begin + length > start_ms and begin < end_ms]
+
+        selection = []
+        if self.fps:
+            step = 1000.0 / min(self.fps, info.fps)
+            time_ms = start_ms
+            while time_ms < end_ms:
+                index = int(np.searchsorted(starts, time_ms, side='right')) - 1
+                if selection and selection[-1][0] == index:
+                    selection[-1] = (index, selection[-1][1] + step)
+                else:
+                    selection.append((index, step))
+                time_ms += step
+        else:
+            for position in range(0, len(window), self.stride):
+                group = window[position:position + self.stride]
+                selection.append((group[0][0], sum(length for _, length in group)))
+
+        if not selection:
+            raise Exception(f'No frames between {self.start}s and {end_ms / 1000:.2f}s')
+        self.selection = selection
+        durations = [float(length) for _, length in selection]
+        fps = len(durations) * 1000.0 / sum(durations)
+        return MediaInfo(info.width, info.height, fps, len(durations), durations)
+
+    def ffmpeg_params(self, source_fps):
+        """(input_params, output_params) pushing the clip into ffmpeg."""
+        input_params = ['-ss', f'{self.start:.3f}'] if self.start else []
+        output_params = ['-t', f'{self.limit:.3f}'] if self.limit is not None else []
+        filters = []
+        fps = self.output_fps(source_fps)
+        if fps:
+            filters.append(f'fps={fps:.6f}')
+        if self.size:
+            # Area averaging is the same block average the engine does
+            filters.append(f'scale={self.size[0]}:{self.size[1]}:flags=area')
+        if filters:
+            output_params += ['-vf', ','.join(filters)]
+        return input_params, output_params
+
+
+class FrameReader:
+    """Iterate decoded frames of a video/GIF without loading the whole clip.
+
+    The prefetch queue is sized from the first frame so that the frames
+    waiting in it never exceed ``max_memory_mb``. A planned ``clip`` (see
+    Clip.plan) is applied by ffmpeg for videos, so skipped frames are never
+    decoded; GIFs are decoded in order but only selected frames are queued.
+    """
+
+    def __init__(self, file_path, max_memory_mb=DEFAULT_MAX_MEMORY_MB, length=None,
+                 clip=None, source_fps=None):
+        self.file_path = file_path
+        self.max_memory_mb = max_memory_mb
+        self.clip = None if clip is None or clip.is_full else clip
+        self.source_fps = source_fps
+        self.prefetch = 1
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Telemetry: decoder busy time, consumer wait time and queue depth
+        self.frames_decoded = 0
+        self.decode_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.depth_total = 0
+        self.depth_max = 0
+
+        self._reader = None
+        self._ffmpeg_frames = None
+        try:
+            if self.clip is not None and self.clip.selection is None:
+                self._open_ffmpeg()
+            else:
+                # Loaded on first use so image-only runs start faster
+                import imageio
+
+                self._reader = imageio.get_reader(file_path)
+        except Exception as e:
+            raise Exception(f'Failed to read video file: {e}')
+        # A probed frame count avoids asking the reader, which may decode
+        self.length = length or self._estimate_length()
+
+    def _open_ffmpeg(self):
+        """Start ffmpeg with the clip's seek, duration, fps and scale options."""
+        import imageio_ffmpeg
+
+        input_params, output_params = self.clip.ffmpeg_params(self.source_fps or 0)
+        if self.clip.size:
+            # imageio-ffmpeg warns whenever the output size differs from the source
+            logging.getLogger('imageio_ffmpeg').setLevel(logging.ERROR)
+        self._ffmpeg_frames = imageio_ffmpeg.read_frames(
+            self.file_path, pix_fmt='rgb24', input_params=input_params,
+            output_params=output_params)
+        meta = next(self._ffmpeg_frames)
+        self._ffmpeg_size = meta['size']
+
+    def _source_frames(self):
+        """Decoded frames after the clip's selection, as RGB(A) arrays."""
+        if self._ffmpeg_frames is not None:
+            width, height = self._ffmpeg_size
+            for data in self._ffmpeg_frames:
+                yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            return
+        if self.clip is None:
+            yield from self._reader
+            return
+        wanted = {index for index, _ in self.clip.selection}
+        last = max(wanted)
+        for index, frame in enumerate(self._reader):
+            if index in wanted:
+                yield frame
+            if index >= last:
+                return
+
+    def _estimate_length(self):
+        """Best-effort frame count for progress reporting (None if unknown)."""
+        if self._reader is None:
+            return None
+        try:
+            length = self._reader.get_length()
+            if length != float('inf'):
+                return int(length)
+            meta = self._reader.get_meta_data()
+            return int(round(meta['duration'] * meta['fps'])) or None
+        except Exception:
+            return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def depth_mean(self):
+        """Average number of frames waiting in the queue when one was taken."""
+        return self.depth_total / self.frames_decoded if self.frames_decoded else 0.0
+
+    @property
+    def ready(self):
+        """True when the next decoded frame is already waiting in the queue."""
+        if self._queue is None:
+            return False
+        with self._queue.mutex:
+            waiting = self._queue.queue
+            return bool(waiting) and waiting[0] is not _END and not isinstance(
+                waiting[0], Exception)
+
+    def __iter__(self):
+        frames = self._source_frames()
+        start = time.perf_counter()
+        try:
+            first = next(frames)
+        except StopIteration:
+            return
+        self.decode_seconds += time.perf_counter() - start
+        self.wait_seconds += time.perf_counter() - start
+        self.frames_decoded = 1
+
+        budget = self.max_memory_mb * 1024 * 1024
+        self.prefetch = max(1, min(MAX_PREFETCH, budget // max(1, first.nbytes)))
+        self._queue = queue.Queue(maxsize=self.prefetch)
+        self._thread = threading.Thread(target=self._decode, args=(frames,), daemon=True)
+        self._thread.start()
+
+        yield first
+        while True:
+            depth = self._queue.qsize()
+            start = time.perf_counter()
+            item = self._queue.get()
+            self.wait_seconds += time.perf_counter() - start
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise Exception(f'Failed to read video file: {item}')
+            self.frames_decoded += 1
+            self.depth_total += depth
+            self.depth_max = max(self.depth_max, depth)
+            yield item
+
+    def _decode(self, frames):
+        """Background decode loop feeding the bounded queue."""
+        try:
+            while True:
+                start = time.perf_counter()
+                frame = next(frames, _END)
+                self.decode_seconds += time.perf_counter() - start
+                if frame is _END:
+                    break
+                if not self._put(frame):
+                    return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(_END)
+
+    def _put(self, item):
+        """Block until the queue has room, unless the reader was closed."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """Stop decoding and release the underlying reader."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._ffmpeg_frames is not None:
+            self._ffmpeg_frames.close()
+            self._ffmpeg_frames = None